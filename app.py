@@ -1,9 +1,16 @@
 import streamlit as st
-import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import time
-import re
-import io
-import csv
+import collections
+from sunbiz_archive import archive_page, get_archive
+from sunbiz_coalesce import detail_flight, search_flight
+from sunbiz_export import EXPORT_FORMATS, export_records
+from sunbiz_jobs import get_executor
+from sunbiz_parse import make_detail_record, make_list_record, pick_owner
+from sunbiz_results import ResultSet, RESULT_COLUMNS
+from sunbiz_search import run_details_job, run_search_job
+from sunbiz_strategies import strategies
+from sunbiz_store import get_store, make_list_meta, normalize_url, FRESHNESS_WINDOW, INCREMENTAL_MAX_AGE
 from playwright.sync_api import sync_playwright
 # Configure Playwright to run without sandbox
 import os
@@ -114,14 +121,147 @@ with col2:
     else:
         search_term = st.text_input("Enter Document Number", placeholder="e.g., L21000123456")
 
-max_results = st.slider("Maximum Results to Scrape", min_value=1, max_value=50, value=10)
+list_only = st.checkbox(
+    "List only (skip detail pages)",
+    help="Read name, document number and status straight from the result list. Details can be fetched afterwards for selected rows."
+)
+
+max_results = st.slider("Maximum Results to Scrape", min_value=1, max_value=500 if list_only else 50, value=10)
+
+incremental = st.checkbox(
+    "Incremental refresh",
+    help="Only refetch detail pages whose name, status or document number changed on the result list, or whose stored record is too old."
+)
+
+# Candidate selectors for result links, tried recent winner first until one matches
+RESULT_SELECTORS = [
+    "a.entity-name",
+    "table.search-results-table a",
+    "div.searchResultsList a",
+    "table tr td:first-child a",
+    "table a[href*='SearchResultDetail']"
+]
+
+# Script returning every result row on the page as one array, so reading a
+# result page costs a single browser round trip instead of several per row
+RESULT_ROWS_SCRIPT = """({ selectors, includeHtml }) => {
+    let selector = null;
+    let links = [];
+    for (const candidate of selectors) {
+        links = Array.from(document.querySelectorAll(candidate));
+        if (links.length > 0) {
+            selector = candidate;
+            break;
+        }
+    }
+    const rows = links.map(link => {
+        const row = link.closest('tr');
+        const cells = row ? Array.from(row.querySelectorAll('td')) : [];
+        const docCell = cells.find(cell => /^[A-Z]{0,2}\\d{4,12}$/.test(cell.innerText.trim()));
+        return {
+            name: link.innerText.trim(),
+            url: link.href || '',
+            status: cells.length > 1 ? cells[1].innerText.trim() : null,
+            documentNumber: docCell ? docCell.innerText.trim() : ''
+        };
+    });
+    // Further result pages linked from this one: numbered page links in the
+    // navigation bar, plus the Next link. Previous links are left out.
+    const pageLinks = Array.from(document.querySelectorAll('a[href]')).map(link => {
+        const text = link.innerText.trim();
+        const inNavigation = link.closest('[class*="navigation"], [class*="pag"]') !== null;
+        if (inNavigation && /^\\d+$/.test(text)) {
+            return { url: link.href, number: parseInt(text, 10) };
+        }
+        // Result cells may link businesses named e.g. "Next Step Realty"
+        if (text.includes('Next') && ((link.title || '').startsWith('Next') || link.closest('td') === null)) {
+            return { url: link.href, number: null };
+        }
+        return null;
+    }).filter(link => link !== null);
+    return {
+        selector: selector,
+        rows: rows,
+        pageLinks: pageLinks,
+        html: includeHtml ? document.documentElement.outerHTML : null
+    };
+}"""
+
+# Script telling whether the page says the search found nothing
+NO_RESULTS_SCRIPT = """() => {
+    const text = document.body ? document.body.textContent : '';
+    return text.includes('No Results Found') || text.includes('No records found');
+}"""
+
+# Result pages loaded ahead in worker tabs while the current page is processed
+LIST_PREFETCH = int(os.environ.get("SUNBIZ_LIST_PREFETCH", "2"))
+
+# Function to read the result rows of a loaded page, archiving its HTML if enabled
+def read_result_page(page):
+    selectors = strategies.order("search_list", RESULT_SELECTORS)
+    page_data = page.evaluate(RESULT_ROWS_SCRIPT, {
+        "selectors": selectors,
+        "includeHtml": get_archive() is not None
+    })
+    strategies.record_probe("search_list", selectors, page_data["selector"])
+    if page_data["html"]:
+        archive_page(page.url, "search", page_data["html"].encode("utf-8"))
+    return page_data
+
+# Function to walk the result pages by URL, starting from the page already loaded.
+# Page URLs come from the list markup rather than clicking Next. Sunbiz pages are
+# cursor-based, so usually only the following page is known at a time; it (and any
+# numbered pages) start loading in worker tabs before the current page is handed
+# back, so the next list page downloads while the caller fetches detail pages.
+def iter_result_pages(context, first_page, prefetch=LIST_PREFETCH):
+    seen_urls = {normalize_url(first_page.url)}
+    highest_number = 1
+    pending_urls = collections.deque()
+    idle_workers = []
+    loading = collections.deque()  # Worker tabs loading the following pages, in page order
+    page_data = read_result_page(first_page)
+    
+    try:
+        while True:
+            # Prefer numbered page links; fall back to the Next link when there are none
+            numbered = sorted(
+                [link for link in page_data["pageLinks"] if link["number"] is not None and link["number"] > highest_number],
+                key=lambda link: link["number"]
+            )
+            links = numbered or [link for link in page_data["pageLinks"] if link["number"] is None][:1]
+            for link in links:
+                url = normalize_url(link["url"])
+                if url and url not in seen_urls:
+                    seen_urls.add(url)
+                    pending_urls.append(url)
+                if link["number"] is not None:
+                    highest_number = link["number"]
+            
+            # Start the following pages loading; goto returns once the response
+            # starts arriving and the rest of the page loads in the background
+            while pending_urls and len(loading) < max(prefetch, 1):
+                worker = idle_workers.pop() if idle_workers else context.new_page()
+                worker.goto(pending_urls.popleft(), wait_until="commit", timeout=30000)
+                loading.append(worker)
+            
+            yield page_data
+            
+            if not loading:
+                return
+            worker = loading.popleft()
+            worker.wait_for_load_state("domcontentloaded", timeout=30000)
+            page_data = read_result_page(worker)
+            idle_workers.append(worker)
+    finally:
+        for worker in idle_workers + list(loading):
+            worker.close()
 
 # Function to scrape Sunbiz using Playwright
-def search_sunbiz(search_type, search_term, max_results, status_text, progress_bar):
+def search_sunbiz(search_type, search_term, max_results, status_text, progress_bar, incremental=False, list_only=False, cancel_event=None):
     results = []
     
     with sync_playwright() as p:
-        browser = p.firefox.launch(headless=True), args=['--no-sandbox'])
+        browser = p.firefox.launch(headless=True, args=['--no-sandbox'])
         context = browser.new_context(
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         )
@@ -152,39 +292,48 @@ def search_sunbiz(search_type, search_term, max_results, status_text, progress_b
                 # Wait for any content to load
                 page.wait_for_load_state("networkidle", timeout=30000)
             
-            # Check if we have results
-            no_results_text = page.content()
-            if "No Results Found" in no_results_text or "No records found" in no_results_text:
+            # Check if we have results, searching the page text in the browser
+            # instead of pulling the whole serialized DOM across
+            if page.evaluate(NO_RESULTS_SCRIPT):
                 status_text.text("No results found")
                 browser.close()
                 return {"success": False, "message": "No results found. Try a different search term."}
             
             # Process all pages of results until we reach max_results
+            store = get_store()
+            stats = {"duplicates_collapsed": 0, "fetches_avoided": 0, "fetches": 0}
+            seen_keys = set()
+            failed_urls = []  # Rows whose detail page couldn't be fetched
             current_count = 0
-            current_page = 1
             
-            while current_count < max_results:
+            # Each page's rows are read in one round trip while the next pages load ahead
+            result_pages = iter_result_pages(context, page)
+            current_page = 0
+            incomplete = False
+            while current_count < max_results and not (cancel_event is not None and cancel_event.is_set()):
+                # A following list page that fails to load (e.g. times out) ends the
+                # run early; the records scraped so far are kept and the run is incomplete
+                try:
+                    page_data = next(result_pages, None)
+                except Exception as e:
+                    if current_page == 0:
+                        raise
+                    status_text.text(f"Stopped at page {current_page + 1}: {str(e)}")
+                    incomplete = True
+                    break
+                if page_data is None:
+                    break
+                current_page += 1
                 status_text.text(f"Processing page {current_page} of results...")
                 
-                # Get all search results on current page
-                result_links = []
-                
-                # Try different selectors for results
-                for selector in [
-                    "a.entity-name",
-                    "table.search-results-table a",
-                    "div.searchResultsList a",
-                    "table tr td:first-child a",
-                    "table a[href*='SearchResultDetail']"
-                ]:
-                    result_links = page.query_selector_all(selector)
-                    if result_links and len(result_links) > 0:
-                        status_text.text(f"Found {len(result_links)} results on page {current_page} with selector: {selector}")
-                        break
+                result_rows = page_data["rows"]
+                if result_rows:
+                    status_text.text(f"Found {len(result_rows)} results on page {current_page} with selector: {page_data['selector']}")
                 
-                if not result_links or len(result_links) == 0:
+                if not result_rows:
                     if current_page == 1:
                         status_text.text("Could not find any search results")
+                        result_pages.close()
                         browser.close()
                         return {"success": False, "message": "No results found. Try a different search term."}
                     else:
@@ -192,102 +341,194 @@ def search_sunbiz(search_type, search_term, max_results, status_text, progress_b
                         break
                 
                 # Process each result on this page
-                for i, link in enumerate(result_links):
+                for row in result_rows:
                     if current_count >= max_results:
                         break
-                        
+                    
+                    # Stop early when the job is cancelled, keeping the results gathered so far
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    
+                    business_name = row["name"]
+                    detail_url = normalize_url(row["url"])
+                    status = row["status"] or "Active"  # Default when the row has no status cell
+                    document_number = row["documentNumber"]
+                    
+                    if not detail_url:
+                        continue
+                    
+                    # Skip links already handled in this run (same entity on several pages)
+                    if detail_url in seen_keys or (document_number and document_number in seen_keys):
+                        stats["duplicates_collapsed"] += 1
+                        continue
+                    seen_keys.add(detail_url)
+                    if document_number:
+                        seen_keys.add(document_number)
+                    
                     # Update progress
                     status_text.text(f"Processing: {current_count+1}/{max_results} businesses")
                     progress_bar.progress((current_count+1) / max_results)
                     
-                    # Get business name and URL
-                    business_name = link.inner_text().strip()
-                    detail_url = link.get_attribute("href")
-                    if detail_url and not detail_url.startswith("http"):
-                        detail_url = "https://search.sunbiz.org" + detail_url
-                    
-                    # Get status if available
-                    status = "Active"  # Default
-                    try:
-                        # Try to find status in the same row
-                        row = link.evaluate("node => node.closest('tr')")
-                        if row:
-                            status_cell = page.evaluate("""row => {
-                                const cells = row.querySelectorAll('td');
-                                return cells.length > 1 ? cells[1].innerText.trim() : null;
-                            }""", row)
-                            if status_cell:
-                                status = status_cell
-                    except Exception:
-                        pass  # Use default status if not found
+                    # List-only mode keeps the row fields without opening the detail page
+                    if list_only:
+                        results.append(make_list_record(business_name, detail_url, status, document_number))
+                        current_count += 1
+                        continue
                     
-                    # Open detail page in new tab
-                    page_detail = context.new_page()
                     try:
-                        page_detail.goto(detail_url, timeout=30000)
-                        page_detail.wait_for_load_state("networkidle", timeout=30000)
-                        
-                        # Extract business details
-                        business_info = extract_business_details(page_detail)
-                        
-                        # Add to results
-                        results.append({
-                            "Business Name": business_name,
-                            "Status": status,
-                            "Document Number": business_info.get("document_number", ""),
-                            "FEI/EIN Number": business_info.get("fei_number", ""),
-                            "Owner Name": business_info.get("owner_name", ""),
-                            "Owner Title": business_info.get("owner_title", ""),
-                            "Owner Email": business_info.get("owner_email", ""),
-                            "Address": business_info.get("address", ""),
-                            "Filing Date": business_info.get("filing_date", ""),
-                            "Sunbiz URL": detail_url
-                        })
-                        
-                        current_count += 1
-                        
-                        # Close detail page
-                        page_detail.close()
-                        
-                        # Small delay to avoid aggressive scraping
-                        time.sleep(0.5)
-                        
+                        record = fetch_detail_record(context, business_name, detail_url, status, document_number, store, stats, incremental, cancel_event)
+                        if record:
+                            results.append(record)
+                            current_count += 1
                     except Exception as e:
                         status_text.text(f"Error processing {business_name}: {str(e)}")
-                        page_detail.close()
-                
-                # Check if we need to go to next page and if there is one
-                if current_count < max_results:
-                    # Look for next page link
-                    next_page = None
-                    for selector in [
-                        "a.navigationLink:has-text('Next')",
-                        "a:has-text('Next')",
-                        "a[href*='Page']:has-text('Next')"
-                    ]:
-                        next_page = page.query_selector(selector)
-                        if next_page:
-                            break
-                    
-                    if next_page:
-                        status_text.text(f"Moving to page {current_page + 1}...")
-                        next_page.click()
-                        page.wait_for_load_state("networkidle", timeout=30000)
-                        current_page += 1
-                    else:
-                        # No more pages
-                        break
-                else:
-                    # We've reached max_results
-                    break
+                        failed_urls.append(detail_url)
+            
+            # Close the worker tabs still loading pages we no longer need
+            result_pages.close()
+            
+            for name, n in stats.items():
+                store.count(name, n)
             
             browser.close()
-            return {"success": True, "data": results}
+            return {"success": True, "data": results, "stats": stats, "failed_urls": failed_urls, "incomplete": incomplete}
             
         except Exception as e:
             browser.close()
             return {"success": False, "message": f"Error: {str(e)}"}
 
+# Function to open a detail page and build its result record, reusing stored records where possible
+def fetch_detail_record(context, business_name, detail_url, status, document_number, store, stats, incremental=False, cancel_event=None):
+    # Reuse a recently scraped record instead of refetching it. In incremental
+    # mode the record is kept until the list metadata changes or it gets too old.
+    list_meta = make_list_meta(business_name, status, document_number)
+    if incremental:
+        cached = store.lookup(detail_url, document_number, INCREMENTAL_MAX_AGE, list_meta)
+    else:
+        cached = store.lookup(detail_url, document_number, FRESHNESS_WINDOW)
+    if cached:
+        cached.update({"Business Name": business_name, "Status": status, "Sunbiz URL": detail_url})
+        stats["fetches_avoided"] += 1
+        return cached
+    
+    # Open the detail page, sharing the fetch with concurrent requests for the same entity
+    record = detail_flight.do(
+        detail_url,
+        lambda: scrape_detail_page(context, business_name, detail_url, status, list_meta, store, stats),
+        cancel_event
+    )
+    if record:
+        record.update({"Business Name": business_name, "Status": status})
+    return record
+
+# Function to open one detail page in a new tab and store its record
+def scrape_detail_page(context, business_name, detail_url, status, list_meta, store, stats):
+    # Open detail page in new tab
+    stats["fetches"] += 1
+    page_detail = context.new_page()
+    try:
+        page_detail.goto(detail_url, timeout=30000)
+        page_detail.wait_for_load_state("networkidle", timeout=30000)
+        archive_page(detail_url, "detail", page_detail.content().encode("utf-8"), list_meta)
+        
+        # Extract business details
+        business_info = extract_business_details(page_detail)
+        
+        record = make_detail_record(business_name, detail_url, status, business_info)
+        store.save(detail_url, record, list_meta, people=business_info.get("people"))
+        
+        # Small delay to avoid aggressive scraping
+        time.sleep(0.5)
+        return record
+    finally:
+        # Close detail page
+        page_detail.close()
+
+# Function to fetch detail pages for selected result rows (e.g. after a list-only search)
+def fetch_details(rows, status_text, progress_bar, incremental=False, cancel_event=None):
+    results = []
+    store = get_store()
+    stats = {"duplicates_collapsed": 0, "fetches_avoided": 0, "fetches": 0}
+    
+    with sync_playwright() as p:
+        browser = p.firefox.launch(headless=True, args=['--no-sandbox'])
+        context = browser.new_context(
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        )
+        for i, (business_name, detail_url, status, document_number) in enumerate(rows):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            status_text.text(f"Processing: {i+1}/{len(rows)} businesses")
+            progress_bar.progress((i+1) / len(rows))
+            try:
+                record = fetch_detail_record(context, business_name, detail_url, status, document_number, store, stats, incremental, cancel_event)
+                if record:
+                    results.append(record)
+            except Exception as e:
+                status_text.text(f"Error processing {business_name}: {str(e)}")
+        browser.close()
+    
+    for name, n in stats.items():
+        store.count(name, n)
+    
+    return {"success": True, "data": results, "stats": stats}
+
+# Script returning all officers, authorized persons and the registered agent on a
+# detail page as {name, title, role} objects, role being officer, authorized or agent
+PEOPLE_SCRIPT = """() => {
+    const people = [];
+    const sectionRegex = /Officer\\/Director|Authorized Person|Annual Reports|Document Images|Registered Agent|Principal Address|Mailing Address|Filing Information/;
+    const textOf = node => (node.nodeType === Node.TEXT_NODE ? node.textContent : (node.innerText || '')).trim();
+    const headings = Array.from(document.querySelectorAll('div, span, h2, h3')).filter(el =>
+        el.children.length === 0 && el.innerText && /Officer\\/Director|Authorized Person/.test(el.innerText));
+    
+    // Sunbiz lists each person as a "Title X" line followed by the name and an
+    // address block; older layouts used a table of (name, title) rows
+    for (const heading of headings) {
+        const role = heading.innerText.includes('Authorized Person') ? 'authorized' : 'officer';
+        let title = null;
+        for (let node = heading.nextSibling; node; node = node.nextSibling) {
+            const text = textOf(node);
+            if (!text) {
+                continue;
+            }
+            if (sectionRegex.test(text)) {
+                break;  // The next section, when sections aren't wrapped in their own element
+            }
+            if (node.nodeName === 'TABLE') {
+                for (const row of node.querySelectorAll('tr')) {
+                    const cells = Array.from(row.querySelectorAll('td'));
+                    if (cells.length >= 2 && cells[0].innerText.trim()) {
+                        people.push({ name: cells[0].innerText.trim(), title: cells[1].innerText.trim(), role: role });
+                    }
+                }
+            } else if (text.startsWith('Title ')) {
+                title = text.slice('Title '.length).trim();
+            } else if (title !== null) {
+                people.push({ name: text.split('\\n')[0].trim(), title: title, role: role });
+                title = null;  // What follows the name is its address
+            }
+        }
+    }
+    
+    const agentSection = Array.from(document.querySelectorAll('div, span, h2, h3')).find(el =>
+        el.children.length === 0 && el.innerText && el.innerText.includes('Registered Agent'));
+    if (agentSection) {
+        let current = agentSection.nextElementSibling;
+        while (current && current.innerText &&
+              !current.innerText.includes('Officer/Director') &&
+              !current.innerText.includes('Authorized Person')) {
+            const text = current.innerText.trim();
+            if (text && text !== 'Name & Address') {
+                people.push({ name: text.split('\\n')[0].trim(), title: 'Registered Agent', role: 'agent' });
+                break;
+            }
+            current = current.nextElementSibling;
+        }
+    }
+    return people;
+}"""
+
 # Function to extract business details from detail page
 def extract_business_details(page):
     # Extract document number
@@ -342,110 +583,12 @@ def extract_business_details(page):
         return '';
     }""")
     
+    
+    # Collect every officer, authorized person and registered agent for the people index
+    people = page.evaluate(PEOPLE_SCRIPT)
+    
     # Extract owner information - prioritize President/CEO
-    owner_info = page.evaluate("""() => {
-        let ownerName = '';
-        let ownerTitle = '';
-        
-        // First check Officer/Director Detail section
-        const officerSection = Array.from(document.querySelectorAll('div, span, h2, h3')).find(el => 
-            el.innerText && el.innerText.includes('Officer/Director Detail'));
-        
-        if (officerSection) {
-            // Find all tables that might contain officer info
-            const tables = Array.from(document.querySelectorAll('table'));
-            for (const table of tables) {
-                const rows = Array.from(table.querySelectorAll('tr'));
-                
-                // First look for President or CEO
-                for (const row of rows) {
-                    const cells = Array.from(row.querySelectorAll('td'));
-                    if (cells.length >= 2) {
-                        const title = cells[1].innerText.toLowerCase();
-                        if (title.includes('president') || title.includes('ceo') || 
-                            title.includes('chief executive')) {
-                            return {
-                                name: cells[0].innerText.trim(),
-                                title: cells[1].innerText.trim()
-                            };
-                        }
-                    }
-                }
-                
-                // If no President/CEO, take the first officer
-                if (rows.length > 0) {
-                    const cells = Array.from(rows[0].querySelectorAll('td'));
-                    if (cells.length >= 2) {
-                        return {
-                            name: cells[0].innerText.trim(),
-                            title: cells[1].innerText.trim()
-                        };
-                    }
-                }
-            }
-        }
-        
-        // Also check for Authorized Person(s) Detail section
-        const authorizedSection = Array.from(document.querySelectorAll('div, span, h2, h3')).find(el => 
-            el.innerText && el.innerText.includes('Authorized Person'));
-        
-        if (authorizedSection) {
-            // Find all tables that might contain authorized person info
-            const tables = Array.from(document.querySelectorAll('table'));
-            for (const table of tables) {
-                const rows = Array.from(table.querySelectorAll('tr'));
-                
-                // First look for Manager or Managing Member
-                for (const row of rows) {
-                    const cells = Array.from(row.querySelectorAll('td'));
-                    if (cells.length >= 2) {
-                        const title = cells[1].innerText.toLowerCase();
-                        if (title.includes('manager') || title.includes('managing member')) {
-                            return {
-                                name: cells[0].innerText.trim(),
-                                title: cells[1].innerText.trim()
-                            };
-                        }
-                    }
-                }
-                
-                // If no Manager, take the first authorized person
-                if (rows.length > 0) {
-                    const cells = Array.from(rows[0].querySelectorAll('td'));
-                    if (cells.length >= 2) {
-                        return {
-                            name: cells[0].innerText.trim(),
-                            title: cells[1].innerText.trim()
-                        };
-                    }
-                }
-            }
-        }
-        
-        // If no officers or authorized persons found, try Registered Agent
-        const agentSection = Array.from(document.querySelectorAll('div, span, h2, h3')).find(el => 
-            el.innerText && el.innerText.includes('Registered Agent'));
-        
-        if (agentSection) {
-            let current = agentSection.nextElementSibling;
-            while (current && current.innerText && 
-                  !current.innerText.includes('Officer/Director') &&
-                  !current.innerText.includes('Authorized Person')) {
-                const text = current.innerText.trim();
-                if (text && text !== 'Name & Address') {
-                    // Take the first line as the name
-                    const lines = text.split('\\n');
-                    return {
-                        name: lines[0].trim(),
-                        title: 'Registered Agent'
-                    };
-                }
-                current = current.nextElementSibling;
-            }
-        }
-        
-        return { name: '', title: '' };
-    }""")
+    owner_name, owner_title = pick_owner(people)
     
     # Extract email - look throughout the page with improved regex
     owner_email = page.evaluate("""() => {
@@ -472,35 +615,14 @@ def extract_business_details(page):
     return {
         "document_number": doc_number,
         "fei_number": fei_number,
-        "owner_name": owner_info.get("name", ""),
-        "owner_title": owner_info.get("title", ""),
+        "owner_name": owner_name,
+        "owner_title": owner_title,
         "owner_email": owner_email,
         "address": address,
-        "filing_date": filing_date
+        "filing_date": filing_date,
+        "people": people
     }
 
-# Function to convert results to CSV
-def convert_to_csv(data):
-    # Create a DataFrame
-    df = pd.DataFrame(data)
-    
-    # Handle any special characters or encoding issues
-    for col in df.columns:
-        df[col] = df[col].apply(lambda x: str(x).replace('\r', ' ').replace('\n', ' ') if pd.notnull(x) else '')
-    
-    # Convert to CSV
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False, quoting=csv.QUOTE_NONNUMERIC)
-    return csv_buffer.getvalue()
-
-# Function to convert results to Excel
-def convert_to_excel(data):
-    df = pd.DataFrame(data)
-    excel_buffer = io.BytesIO()
-    df.to_excel(excel_buffer, index=False, engine='openpyxl')
-    excel_buffer.seek(0)
-    return excel_buffer
-
 # Create a card-like container for the button
 st.markdown("""
 <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
@@ -511,51 +633,168 @@ start_button = st.button("Start Scraping")
 
 st.markdown("</div>", unsafe_allow_html=True)
 
-# Initialize session state for results
-if 'results' not in st.session_state:
-    st.session_state.results = None
+# Initialize session state for the result set and the background scrape job
+if 'result_set' not in st.session_state:
+    st.session_state.result_set = None
+if 'job_id' not in st.session_state:
+    # Resume a job started before a reconnect (its ID is kept in the URL)
+    st.session_state.job_id = st.experimental_get_query_params().get("job", [None])[0]
+if 'detail_job_id' not in st.session_state:
+    # Background job fetching details for rows selected in the result set
+    st.session_state.detail_job_id = None
+
+executor = get_executor()
+ctx = get_script_run_ctx()
+owner = ctx.session_id if ctx else "anonymous"
 
 if start_button:
     if not search_term:
         st.error("Please enter a search term.")
     else:
-        # Create a progress container
-        progress_container = st.container()
-        with progress_container:
-            st.markdown("""
-            <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
-                <h3 style="margin-top: 0; color: #0083B8;">Scraping Progress</h3>
-            """, unsafe_allow_html=True)
-            
-            # Create a progress bar and status text
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            status_text.text("Starting search...")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Run the scraper
-        results = search_sunbiz(search_type, search_term, max_results, status_text, progress_bar)
+        # Run the scraper on the shared background executor so reruns don't interrupt it.
+        # The job stands in for the status text and progress bar.
+        job_args = (search_type, search_term, max_results, incremental, list_only)
+        job = executor.submit(owner, search_term, lambda job, args=job_args: run_search_job(job, search_sunbiz, *args))
+        st.session_state.job_id = job.id
+        st.experimental_set_query_params(job=job.id)
+
+job_running = False
+job = executor.get(st.session_state.job_id) if st.session_state.job_id else None
+if st.session_state.job_id and job is None:
+    # The job expired or the server restarted
+    st.session_state.job_id = None
+    st.experimental_set_query_params()
+elif job is not None and not job.finished():
+    job_running = True
+    st.markdown("""
+    <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
+        <h3 style="margin-top: 0; color: #0083B8;">Scraping Progress</h3>
+    """, unsafe_allow_html=True)
+    
+    # Show the job's latest progress; the page polls until it finishes
+    st.progress(min(job.fraction, 1.0))
+    if job.state == "queued":
+        st.text(f"Queued behind other searches (position {executor.queue_position(job.id)})...")
+    else:
+        st.text(job.message)
+    if st.button("Cancel Scraping"):
+        executor.cancel(job.id)
+    
+    st.markdown("</div>", unsafe_allow_html=True)
+elif job is not None:
+    st.session_state.job_id = None
+    st.experimental_set_query_params()
+    executor.pop(job.id)
+    results = job.result
+    
+    if results["success"]:
+        # Spill the results to disk; only the visible page is loaded on each rerun.
+        # A detail fetch still running against the old result set is stopped.
+        if st.session_state.detail_job_id:
+            executor.cancel(st.session_state.detail_job_id)
+            st.session_state.detail_job_id = None
+        if st.session_state.result_set is not None:
+            st.session_state.result_set.delete()
+        st.session_state.result_set = ResultSet.create(results["data"], results.get("delta"))
+        if job.state == "cancelled":
+            st.warning(f"Scraping cancelled. Kept {len(results['data'])} businesses found so far.")
+        else:
+            st.success(f"Found {len(results['data'])} businesses.")
         
-        # Reset progress indicators
-        progress_container.empty()
+        # Show how many detail fetches the dedup layer avoided
+        run_stats = results.get("stats", {})
+        total_stats = get_store().stats()
+        st.caption(
+            f"Fetched {run_stats.get('fetches', 0)} detail pages, reused {run_stats.get('fetches_avoided', 0)} cached records "
+            f"and collapsed {run_stats.get('duplicates_collapsed', 0)} duplicate links. "
+            f"Fetches avoided since startup: {total_stats.get('fetches_avoided', 0) + total_stats.get('duplicates_collapsed', 0)}, "
+            f"plus {search_flight.stats()['coalesced']} identical searches and {detail_flight.stats()['coalesced']} detail fetches "
+            f"shared with concurrent requests."
+        )
+        transport = results.get("transport")
+        if transport:
+            st.caption(
+                f"Detail requests since startup: {transport.get('HTTP/2', 0)} over HTTP/2, {transport.get('HTTP/1.1', 0)} over HTTP/1.1 "
+                f"(server without HTTP/2), and {transport.get('fallbacks', 0)} retried over HTTP/1.1 after an HTTP/2 error."
+            )
+        if st.session_state.result_set.has_changes():
+            change_counts = st.session_state.result_set.change_counts()
+            st.caption(
+                f"Since the previous run of this search: {change_counts.get('added', 0)} added, "
+                f"{change_counts.get('changed', 0)} changed and {change_counts.get('removed', 0)} removed."
+            )
+        elif results.get("incomplete"):
+            st.caption("Some result pages could not be loaded, so changes since the previous run were not computed.")
         
-        if results["success"]:
-            st.session_state.results = results["data"]
-            st.success(f"Found {len(results['data'])} businesses.")
-        else:
-            st.error(results["message"])
+        # Show which selectors and extraction paths are currently tried first
+        with st.expander("Selector strategy hit rates"):
+            st.dataframe(strategies.stats(), use_container_width=True)
+    else:
+        st.error(results["message"])
 
 # Display results if available
-if st.session_state.results:
+if st.session_state.result_set is not None and len(st.session_state.result_set) > 0:
+    result_set = st.session_state.result_set
+    
     # Results container
     st.markdown("""
     <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
         <h3 style="margin-top: 0; color: #0083B8;">Search Results</h3>
     """, unsafe_allow_html=True)
     
+    # Filter, sort and page on the server so only the visible window reaches the browser
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        filter_text = st.text_input("Filter Results", placeholder="Matches any column")
+    with col2:
+        sort_by = st.selectbox("Sort By", ["(original order)"] + RESULT_COLUMNS)
+    with col3:
+        page_size = st.selectbox("Rows per Page", [25, 50, 100], index=1)
+    descending = st.checkbox("Sort descending")
+    
+    total = result_set.count(filter_text)
+    page_count = max(1, (total + page_size - 1) // page_size)
+    page_number = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    page_rows = result_set.page((page_number - 1) * page_size, page_size, sort_by, descending, filter_text)
+    
     # Display as a table
-    st.dataframe(st.session_state.results, use_container_width=True)
+    st.dataframe([record for _, record in page_rows], use_container_width=True)
+    st.caption(f"Page {page_number} of {page_count} ({total} matching businesses)")
+    
+    # Fetch detail pages lazily for selected rows (e.g. after a list-only search).
+    # Like searches, this runs on the background executor so reruns don't interrupt it.
+    detail_job = executor.get(st.session_state.detail_job_id) if st.session_state.detail_job_id else None
+    if detail_job is not None and not detail_job.finished():
+        job_running = True
+        st.progress(min(detail_job.fraction, 1.0))
+        if detail_job.state == "queued":
+            st.text(f"Queued behind other searches (position {executor.queue_position(detail_job.id)})...")
+        else:
+            st.text(detail_job.message)
+        if st.button("Cancel Fetching Details"):
+            executor.cancel(detail_job.id)
+    else:
+        if detail_job is not None:
+            executor.pop(detail_job.id)
+            if not detail_job.result["success"]:
+                st.error(detail_job.result["message"])
+            elif detail_job.state == "cancelled":
+                st.warning(f"Fetching details cancelled. Updated {detail_job.result.get('updated', 0)} businesses.")
+            else:
+                st.success(f"Fetched details for {detail_job.result['updated']} businesses.")
+        st.session_state.detail_job_id = None
+        
+        page_records = dict(page_rows)
+        selected_rows = st.multiselect(
+            "Fetch details for selected businesses",
+            options=list(page_records),
+            format_func=lambda row_id: f"{page_records[row_id]['Business Name']} ({page_records[row_id]['Document Number']})"
+        )
+        if selected_rows and st.button("Fetch Details"):
+            detail_args = (result_set, [(row_id, page_records[row_id]) for row_id in selected_rows], incremental)
+            detail_job = executor.submit(owner, "Fetch details", lambda job, args=detail_args: run_details_job(job, fetch_details, *args))
+            st.session_state.detail_job_id = detail_job.id
+            st.rerun()
     
     st.markdown("</div>", unsafe_allow_html=True)
     
@@ -565,34 +804,65 @@ if st.session_state.results:
         <h3 style="margin-top: 0; color: #0083B8;">Export Options</h3>
     """, unsafe_allow_html=True)
     
-    col1, col2 = st.columns(2)
-    
-    # CSV export
-    with col1:
-        csv_data = convert_to_csv(st.session_state.results)
-        st.download_button(
-            label="Download CSV",
-            data=csv_data,
-            file_name=f"sunbiz_results_{search_term.replace(' ', '_')}.csv",
-            mime="text/csv",
-            key="csv_download",
-            help="Download results as CSV (compatible with Excel, Google Sheets, etc.)"
+    # Delta exports hold only what changed since the previous run of this search
+    changes_only = False
+    if result_set.has_changes():
+        changes_only = st.checkbox(
+            "Changes only",
+            help="Export only records added, changed or removed since the previous run of this search, with a Change Type column."
         )
     
-    # Excel export
-    with col2:
-        excel_data = convert_to_excel(st.session_state.results)
-        st.download_button(
-            label="Download Excel",
-            data=excel_data,
-            file_name=f"sunbiz_results_{search_term.replace(' ', '_')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            key="excel_download",
-            help="Download results as Excel spreadsheet"
-        )
+    export_format = st.selectbox(
+        "Export format",
+        list(EXPORT_FORMATS),
+        help="CSV opens in Excel, Google Sheets, etc.; JSONL has one record per line; Parquet suits data tools."
+    )
+    
+    # Exports stream the result set from disk into a file, so they are only built on request
+    if st.button("Prepare Export"):
+        if changes_only:
+            export_data = export_records(result_set.iter_changes(), export_format)
+            file_stem = f"sunbiz_changes_{search_term.replace(' ', '_')}"
+        else:
+            export_data = export_records(result_set.iter_records(), export_format)
+            file_stem = f"sunbiz_results_{search_term.replace(' ', '_')}"
+        
+        if export_data is None:
+            st.info("No changes since the previous run of this search.")
+        else:
+            extension, mime, _ = EXPORT_FORMATS[export_format]
+            st.download_button(
+                label=f"Download {export_format}",
+                data=export_data,
+                file_name=f"{file_stem}{extension}",
+                mime=mime,
+                key="export_download",
+                help=f"Download results as {export_format}"
+            )
     
     st.markdown("</div>", unsafe_allow_html=True)
 
+# Owner lookup: which scraped companies a person or registered agent is tied to
+st.markdown("""
+<div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
+    <h3 style="margin-top: 0; color: #0083B8;">Owner Lookup</h3>
+""", unsafe_allow_html=True)
+
+person_name = st.text_input(
+    "Find companies by officer, authorized person or registered agent",
+    placeholder="e.g., Jane Doe",
+    help="Searches every detail page scraped so far. Case, punctuation and word order are ignored."
+)
+if person_name:
+    person_matches = get_store().lookup_person(person_name)
+    if person_matches:
+        st.dataframe(person_matches, use_container_width=True)
+        st.caption(f"{len({match['Document Number'] or match['Sunbiz URL'] for match in person_matches})} companies linked to {person_name}")
+    else:
+        st.info("No scraped companies list this name.")
+
+st.markdown("</div>", unsafe_allow_html=True)
+
 # Footer with disclaimer
 st.markdown("---")
 st.markdown("""
@@ -609,3 +879,8 @@ st.markdown("""
     <p><strong>Disclaimer:</strong> Please ensure your use complies with Sunbiz terms of service and applicable laws. This tool is for informational purposes only.</p>
 </div>
 """, unsafe_allow_html=True)
+
+# Poll the background job until it finishes
+if job_running:
+    time.sleep(1)
+    st.rerun()
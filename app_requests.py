@@ -1,11 +1,22 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
 import time
-import re
-import io
-import csv
+import threading
+import codecs
+import itertools
+from sunbiz_archive import archive_page, get_archive
+from sunbiz_coalesce import detail_flight, search_flight
+from sunbiz_export import EXPORT_FORMATS, export_records
+from sunbiz_http2 import get_http2_client
+from sunbiz_jobs import get_executor
+from sunbiz_parse import extract_result_rows, find_next_page_url, make_detail_record, make_list_record, parse_detail_page, ResultListParser
+from sunbiz_pipeline import run_pipeline, RateLimiter, FETCH_RATE, FETCH_WORKERS
+from sunbiz_results import ResultSet, RESULT_COLUMNS
+from sunbiz_search import run_details_job, run_search_job
+from sunbiz_strategies import strategies
+from sunbiz_store import get_store, make_list_meta, FRESHNESS_WINDOW, INCREMENTAL_MAX_AGE
 
 # Set page configuration
 st.set_page_config(
@@ -76,239 +87,284 @@ with col2:
     else:
         search_term = st.text_input("Enter Document Number", placeholder="e.g., L21000123456")
 
-max_results = st.slider("Maximum Results to Scrape", min_value=1, max_value=50, value=10)
+list_only = st.checkbox(
+    "List only (skip detail pages)",
+    help="Read name, document number and status straight from the result list. Details can be fetched afterwards for selected rows."
+)
 
-# Function to search Sunbiz using requests
-def search_sunbiz(search_type, search_term, max_results, status_text, progress_bar):
-    results = []
+max_results = st.slider("Maximum Results to Scrape", min_value=1, max_value=500 if list_only else 50, value=10)
+
+incremental = st.checkbox(
+    "Incremental refresh",
+    help="Only refetch detail pages whose name, status or document number changed on the result list, or whose stored record is too old."
+)
+
+# Set up headers to mimic a browser
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0'
+}
+
+# Bytes read from a result page at a time while it streams in
+STREAM_CHUNK_SIZE = 8192
+
+# Name of the streaming result parser in the selector strategy stats
+STREAMING_STRATEGY = "streaming parser"
+
+# Raised when the first result page shows the search cannot return anything
+class SearchFailed(Exception):
+    pass
+
+# Function to download a result page as a stream, yielding its rows as soon as they
+# are parsed. Afterwards the parser holds the next page URL and the no-results flag.
+def stream_result_page(session, page_url, parser):
+    with session.get(page_url, stream=True) as response:
+        if response.status_code != 200:
+            raise SearchFailed(f"Error: Received status code {response.status_code}")
+        
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        body = []
+        chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        try:
+            for chunk in chunks:
+                body.append(chunk)
+                parser.feed(decoder.decode(chunk))
+                yield from parser.take_rows()
+                if parser.no_results:
+                    break
+            parser.feed(decoder.decode(b"", final=True))
+            parser.close()
+            yield from parser.take_rows()
+        except GeneratorExit:
+            # The caller stopped reading (enough rows, or cancelled); read the
+            # rest of the page so the archive still gets all of it
+            if get_archive() is not None:
+                try:
+                    archive_page(page_url, "search", b"".join(body) + b"".join(chunks))
+                except requests.RequestException:
+                    pass  # The rest of the page didn't arrive; there is nothing whole to archive
+            raise
+        if get_archive() is not None:
+            body += list(chunks)  # Anything after a "no results" message
     
-    # Set up headers to mimic a browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'max-age=0'
-    }
+    body = b"".join(body)
+    archive_page(page_url, "search", body)
+    
+    # Layouts the streaming parser doesn't recognise fall back to the full parse.
+    # The streaming parser counts as the first search_list strategy; like other
+    # probes, pages where nothing matched are not held against it.
+    if parser.rows_seen:
+        strategies.record("search_list", STREAMING_STRATEGY, True)
+    elif not parser.no_results:
+        soup = BeautifulSoup(body, 'html.parser')
+        rows = extract_result_rows(soup)
+        if rows:
+            strategies.record("search_list", STREAMING_STRATEGY, False)
+        yield from rows
+        parser.next_url = parser.next_url or find_next_page_url(soup)
+
+# Function to stream result rows across pages, collapsing duplicates before any fetch is
+# scheduled. Rows are produced while pages download, so detail fetches start early.
+# A page that fails once rows have been produced (e.g. the connection drops on a
+# later page) ends the rows early and is noted in page_errors.
+def stream_result_rows(session, page_url, max_results, stats, status_text, cancel_event=None, page_errors=None):
+    seen_keys = set()
+    found = 0
+    current_page = 1
+    while page_url and found < max_results:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if current_page > 1:
+            status_text.text(f"Moving to page {current_page}...")
+            time.sleep(0.5)
+        
+        parser = ResultListParser()
+        try:
+            page_rows = 0
+            for business_name, detail_url, status, document_number in stream_result_page(session, page_url, parser):
+                page_rows += 1
+                if detail_url in seen_keys or (document_number and document_number in seen_keys):
+                    stats["duplicates_collapsed"] += 1
+                    continue
+                seen_keys.add(detail_url)
+                if document_number:
+                    seen_keys.add(document_number)
+                found += 1
+                yield (business_name, detail_url, status, document_number)
+                if found >= max_results or (cancel_event is not None and cancel_event.is_set()):
+                    return
+        except (SearchFailed, requests.RequestException) as e:
+            if not found:
+                raise
+            status_text.text(f"Stopped at page {current_page}: {str(e)}")
+            if page_errors is not None:
+                page_errors.append(str(e))
+            return
+        
+        # Only the first page decides whether the search found anything
+        if current_page == 1 and page_rows == 0:
+            if parser.no_results:
+                status_text.text("No results found")
+                raise SearchFailed("No results found. Try a different search term.")
+            raise SearchFailed("Could not find search results. The website structure may have changed.")
+        if page_rows == 0:
+            return
+        
+        status_text.text(f"Found {found} businesses on {current_page} page(s)")
+        page_url = parser.next_url
+        current_page += 1
+
+# Function to search Sunbiz using requests
+def search_sunbiz(search_type, search_term, max_results, status_text, progress_bar, incremental=False, list_only=False, cancel_event=None):
+    session = requests.Session()
+    session.headers.update(HEADERS)
     
     try:
         # Navigate to the search page based on search type
         if search_type == "Business Name":
             status_text.text("Searching by business name...")
-            search_url = "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResults/EntityName/" + search_term
-            response = requests.get(search_url, headers=headers )
+            page_url = "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResults/EntityName/" + search_term
         else:
             # Document Number search
             status_text.text("Searching by document number...")
-            search_url = "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResults/DocumentNumber/" + search_term
-            response = requests.get(search_url, headers=headers )
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            return {"success": False, "message": f"Error: Received status code {response.status_code}"}
+            page_url = "https://search.sunbiz.org/Inquiry/CorporationSearch/SearchResults/DocumentNumber/" + search_term
         
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
+        stats = {"duplicates_collapsed": 0, "fetches_avoided": 0, "fetches": 0}
+        page_errors = []
+        rows = stream_result_rows(session, page_url, max_results, stats, status_text, cancel_event, page_errors)
         
-        # Check if we have results
-        no_results = soup.find(string=re.compile("No Results Found")) or soup.find(string=re.compile("No records found"))
-        if no_results:
-            status_text.text("No results found")
-            return {"success": False, "message": "No results found. Try a different search term."}
+        # Read up to the first row here, so a failed search is reported before any fetch starts
+        first_row = next(rows, None)
+        rows = itertools.chain([first_row], rows) if first_row else iter([])
         
-        # Find all search results
-        result_links = []
+        # List-only mode returns the row fields without opening any detail page
+        if list_only:
+            records = []
+            for row in rows:
+                records.append(make_list_record(*row))
+                progress_bar.progress(min(len(records) / max_results, 1.0))
+            get_store().count("duplicates_collapsed", stats["duplicates_collapsed"])
+            return {"success": True, "data": records, "stats": stats, "incomplete": bool(page_errors)}
         
-        # Try different selectors for results
-        search_results_table = soup.find('table', class_='search-results-table')
-        if search_results_table:
-            result_links = search_results_table.find_all('a')
-        else:
-            # Try alternative selectors
-            result_links = soup.select('a.entity-name') or soup.select('table tr td:first-child a')
-        
-        if not result_links:
-            return {"success": False, "message": "Could not find search results. The website structure may have changed."}
-        
-        # Process each result
-        current_count = 0
-        for i, link in enumerate(result_links):
-            if current_count >= max_results:
-                break
-                
-            # Update progress
-            status_text.text(f"Processing: {current_count+1}/{max_results} businesses")
-            progress_bar.progress((current_count+1) / max_results)
-            
-            # Get business name and URL
-            business_name = link.text.strip()
-            detail_url = link.get('href')
-            if detail_url and not detail_url.startswith("http" ):
-                detail_url = "https://search.sunbiz.org" + detail_url
-            
-            # Get status if available
-            status = "Active"  # Default
-            try:
-                # Try to find status in the same row
-                parent_row = link.find_parent('tr' )
-                if parent_row:
-                    status_cell = parent_row.find_all('td')
-                    if len(status_cell) > 1:
-                        status = status_cell[1].text.strip()
-            except Exception:
-                pass  # Use default status if not found
-            
-            # Get detail page
-            try:
-                detail_response = requests.get(detail_url, headers=headers)
-                if detail_response.status_code == 200:
-                    detail_soup = BeautifulSoup(detail_response.text, 'html.parser')
-                    
-                    # Extract business details
-                    business_info = extract_business_details(detail_soup)
-                    
-                    # Add to results
-                    results.append({
-                        "Business Name": business_name,
-                        "Status": status,
-                        "Document Number": business_info.get("document_number", ""),
-                        "FEI/EIN Number": business_info.get("fei_number", ""),
-                        "Owner Name": business_info.get("owner_name", ""),
-                        "Owner Title": business_info.get("owner_title", ""),
-                        "Owner Email": business_info.get("owner_email", ""),
-                        "Address": business_info.get("address", ""),
-                        "Filing Date": business_info.get("filing_date", ""),
-                        "Sunbiz URL": detail_url
-                    })
-                    
-                    current_count += 1
-                    
-                    # Small delay to avoid aggressive scraping
-                    time.sleep(1)
-            except Exception as e:
-                status_text.text(f"Error processing {business_name}: {str(e)}")
-        
-        return {"success": True, "data": results}
-            
+        results = fetch_details(rows, status_text, progress_bar, incremental, session, stats, cancel_event, total=max_results)
+        results["incomplete"] = results.get("incomplete") or bool(page_errors)
+        return results
+    
+    except SearchFailed as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}"}
 
-# Function to extract business details from detail page
-def extract_business_details(soup):
-    # Extract document number
-    doc_number = ""
-    doc_label = soup.find(string=re.compile("Document Number"))
-    if doc_label:
-        doc_element = doc_label.find_parent().find_next_sibling()
-        if doc_element:
-            doc_number = doc_element.text.strip()
+# Function to fetch one detail page, returning its raw HTML for the parse stage
+def fetch_detail_page(session, detail_url, list_meta, http2_client=None, rate=None):
+    # Wait for a free slot to avoid aggressive scraping
+    if rate is not None:
+        rate.wait()
+    if http2_client is not None:
+        detail_response = http2_client.get(detail_url, fallback=session)
+    else:
+        detail_response = session.get(detail_url)
+    if detail_response.status_code != 200:
+        return None
+    archive_page(detail_url, "detail", detail_response.content, list_meta)
+    return detail_response.content
+
+# Function to fetch detail pages for result rows, reusing stored records where possible.
+# Pages are fetched on worker threads and parsed in the shared process pool. rows may be
+# a lazy iterator (e.g. streamed from a result page that is still downloading), in which
+# case total gives the expected number of rows for the progress bar.
+def fetch_details(rows, status_text, progress_bar, incremental=False, session=None, stats=None, cancel_event=None, total=None):
+    store = get_store()
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+    if stats is None:
+        stats = {"duplicates_collapsed": 0, "fetches_avoided": 0, "fetches": 0}
+    if total is None:
+        total = len(rows)
+    stats_lock = threading.Lock()
     
-    # Extract FEI/EIN Number
-    fei_number = ""
-    fei_label = soup.find(string=re.compile("FEI/EIN Number"))
-    if fei_label:
-        fei_element = fei_label.find_parent().find_next_sibling()
-        if fei_element:
-            fei_number = fei_element.text.strip()
+    # Detail pages go over HTTP/2 when enabled, multiplexing up to HTTP2_STREAMS
+    # requests on a few connections instead of one request per connection. That
+    # many fetchers run, so slow responses don't hold back the request rate; the
+    # shared rate limiter keeps the rate the same with either transport.
+    http2_client = get_http2_client(HEADERS)
+    fetch_workers = http2_client.max_streams if http2_client is not None else FETCH_WORKERS
+    rate = RateLimiter(FETCH_RATE)
     
-    # Extract filing date
-    filing_date = ""
-    date_label = soup.find(string=re.compile("Date Filed"))
-    if date_label:
-        date_element = date_label.find_parent().find_next_sibling()
-        if date_element:
-            filing_date = date_element.text.strip()
+    # Records by row index, so results keep the order of the result list
+    records = {}
+    # Rows whose detail page couldn't be fetched
+    failed_urls = []
     
-    # Extract principal address
-    address = ""
-    address_label = soup.find(string=re.compile("Principal Address"))
-    if address_label:
-        address_element = address_label.find_parent()
-        if address_element:
-            next_elements = address_element.find_next_siblings()
-            for element in next_elements:
-                if "Mailing Address" in element.text or "Registered Agent" in element.text:
-                    break
-                if element.text.strip():
-                    address += element.text.strip() + ", "
-            address = address.rstrip(", ")
+    # Pulled by the fetcher threads, so it runs as rows arrive
+    def pending():
+        for i, row in enumerate(rows):
+            business_name, detail_url, status, document_number = row
+            # Reuse a recently scraped record instead of refetching it. In incremental
+            # mode the record is kept until the list metadata changes or it gets too old.
+            list_meta = make_list_meta(business_name, status, document_number)
+            if incremental:
+                cached = store.lookup(detail_url, document_number, INCREMENTAL_MAX_AGE, list_meta)
+            else:
+                cached = store.lookup(detail_url, document_number, FRESHNESS_WINDOW)
+            if cached:
+                cached.update({"Business Name": business_name, "Status": status, "Sunbiz URL": detail_url})
+                records[i] = cached
+                with stats_lock:
+                    stats["fetches_avoided"] += 1
+            else:
+                yield (i, row, list_meta)
     
-    # Extract owner information - prioritize President/CEO
-    owner_name = ""
-    owner_title = ""
+    # Runs on fetcher threads; shares the fetch with concurrent requests for the same entity
+    def fetch(item):
+        _, (business_name, detail_url, status, document_number), list_meta = item
+        def fetch_page():
+            with stats_lock:
+                stats["fetches"] += 1
+            return fetch_detail_page(session, detail_url, list_meta, http2_client, rate)
+        return detail_flight.do(detail_url, fetch_page, cancel_event)
     
-    # Look for Officer/Director section
-    officer_tables = soup.find_all('table')
-    for table in officer_tables:
-        rows = table.find_all('tr')
-        
-        # First look for President or CEO
-        for row in rows:
-            cells = row.find_all('td')
-            if len(cells) >= 2:
-                title = cells[1].text.lower()
-                if "president" in title or "ceo" in title or "chief executive" in title:
-                    owner_name = cells[0].text.strip()
-                    owner_title = cells[1].text.strip()
-                    break
-        
-        # If no President/CEO, take the first officer
-        if not owner_name and rows:
-            cells = rows[0].find_all('td')
-            if len(cells) >= 2:
-                owner_name = cells[0].text.strip()
-                owner_title = cells[1].text.strip()
-    
-    # Extract email - look throughout the page
-    owner_email = ""
-    email_regex = r'[\w.+-]+@[\w-]+\.[\w.-]+'
-    page_text = soup.get_text()
-    email_matches = re.findall(email_regex, page_text)
-    
-    if email_matches:
-        # Filter out common false positives
-        filtered_emails = [email for email in email_matches if 
-                          not email.endswith('@sunbiz.org') and 
-                          not email.endswith('@dos.myflorida.com') and
-                          not email.endswith('@leg.state.fl.us') and
-                          not 'example.com' in email and
-                          not 'domain.com' in email]
+    # Runs on this thread as each parsed page comes back from the process pool
+    fetched = 0
+    def on_result(item, business_info, error):
+        nonlocal fetched
+        i, (business_name, detail_url, status, document_number), list_meta = item
+        if error is not None:
+            status_text.text(f"Error processing {business_name}: {str(error)}")
+        if business_info is not None:
+            record = make_detail_record(business_name, detail_url, status, business_info)
+            store.save(detail_url, record, list_meta, people=business_info.get("people"))
+            records[i] = record
+        else:
+            failed_urls.append(detail_url)
         
-        if filtered_emails:
-            owner_email = filtered_emails[0]
+        # Update progress, counting records reused from the store as done
+        fetched += 1
+        processed = fetched + stats["fetches_avoided"]
+        status_text.text(f"Processing: {processed}/{total} businesses")
+        progress_bar.progress(min(processed / total, 1.0))
     
-    return {
-        "document_number": doc_number,
-        "fei_number": fei_number,
-        "owner_name": owner_name,
-        "owner_title": owner_title,
-        "owner_email": owner_email,
-        "address": address,
-        "filing_date": filing_date
-    }
-
-# Function to convert results to CSV
-def convert_to_csv(data):
-    # Create a DataFrame
-    df = pd.DataFrame(data)
+    # If the run stops part way (reading the streamed result pages failed, or a
+    # record couldn't be saved), keep what was fetched and mark the run incomplete
+    incomplete = False
+    try:
+        run_pipeline(pending(), fetch, parse_detail_page, on_result, cancel_event, fetch_workers)
+    except Exception as e:
+        status_text.text(f"Stopped early: {str(e)}")
+        incomplete = True
     
-    # Handle any special characters or encoding issues
-    for col in df.columns:
-        df[col] = df[col].apply(lambda x: str(x).replace('\r', ' ').replace('\n', ' ') if pd.notnull(x) else '')
+    for name, n in stats.items():
+        store.count(name, n)
     
-    # Convert to CSV
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False, quoting=csv.QUOTE_NONNUMERIC)
-    return csv_buffer.getvalue()
-
-# Function to convert results to Excel
-def convert_to_excel(data):
-    df = pd.DataFrame(data)
-    excel_buffer = io.BytesIO()
-    df.to_excel(excel_buffer, index=False, engine='openpyxl')
-    excel_buffer.seek(0)
-    return excel_buffer
+    results = {"success": True, "data": [records[i] for i in sorted(records)], "stats": stats, "failed_urls": failed_urls, "incomplete": incomplete}
+    if http2_client is not None:
+        results["transport"] = http2_client.stats()
+    return results
 
 # Create a card-like container for the button
 st.markdown("""
@@ -320,51 +376,168 @@ start_button = st.button("Start Scraping")
 
 st.markdown("</div>", unsafe_allow_html=True)
 
-# Initialize session state for results
-if 'results' not in st.session_state:
-    st.session_state.results = None
+# Initialize session state for the result set and the background scrape job
+if 'result_set' not in st.session_state:
+    st.session_state.result_set = None
+if 'job_id' not in st.session_state:
+    # Resume a job started before a reconnect (its ID is kept in the URL)
+    st.session_state.job_id = st.experimental_get_query_params().get("job", [None])[0]
+if 'detail_job_id' not in st.session_state:
+    # Background job fetching details for rows selected in the result set
+    st.session_state.detail_job_id = None
+
+executor = get_executor()
+ctx = get_script_run_ctx()
+owner = ctx.session_id if ctx else "anonymous"
 
 if start_button:
     if not search_term:
         st.error("Please enter a search term.")
     else:
-        # Create a progress container
-        progress_container = st.container()
-        with progress_container:
-            st.markdown("""
-            <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
-                <h3 style="margin-top: 0; color: #0083B8;">Scraping Progress</h3>
-            """, unsafe_allow_html=True)
-            
-            # Create a progress bar and status text
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            status_text.text("Starting search...")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Run the scraper
-        results = search_sunbiz(search_type, search_term, max_results, status_text, progress_bar)
+        # Run the scraper on the shared background executor so reruns don't interrupt it.
+        # The job stands in for the status text and progress bar.
+        job_args = (search_type, search_term, max_results, incremental, list_only)
+        job = executor.submit(owner, search_term, lambda job, args=job_args: run_search_job(job, search_sunbiz, *args))
+        st.session_state.job_id = job.id
+        st.experimental_set_query_params(job=job.id)
+
+job_running = False
+job = executor.get(st.session_state.job_id) if st.session_state.job_id else None
+if st.session_state.job_id and job is None:
+    # The job expired or the server restarted
+    st.session_state.job_id = None
+    st.experimental_set_query_params()
+elif job is not None and not job.finished():
+    job_running = True
+    st.markdown("""
+    <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
+        <h3 style="margin-top: 0; color: #0083B8;">Scraping Progress</h3>
+    """, unsafe_allow_html=True)
+    
+    # Show the job's latest progress; the page polls until it finishes
+    st.progress(min(job.fraction, 1.0))
+    if job.state == "queued":
+        st.text(f"Queued behind other searches (position {executor.queue_position(job.id)})...")
+    else:
+        st.text(job.message)
+    if st.button("Cancel Scraping"):
+        executor.cancel(job.id)
+    
+    st.markdown("</div>", unsafe_allow_html=True)
+elif job is not None:
+    st.session_state.job_id = None
+    st.experimental_set_query_params()
+    executor.pop(job.id)
+    results = job.result
+    
+    if results["success"]:
+        # Spill the results to disk; only the visible page is loaded on each rerun.
+        # A detail fetch still running against the old result set is stopped.
+        if st.session_state.detail_job_id:
+            executor.cancel(st.session_state.detail_job_id)
+            st.session_state.detail_job_id = None
+        if st.session_state.result_set is not None:
+            st.session_state.result_set.delete()
+        st.session_state.result_set = ResultSet.create(results["data"], results.get("delta"))
+        if job.state == "cancelled":
+            st.warning(f"Scraping cancelled. Kept {len(results['data'])} businesses found so far.")
+        else:
+            st.success(f"Found {len(results['data'])} businesses.")
         
-        # Reset progress indicators
-        progress_container.empty()
+        # Show how many detail fetches the dedup layer avoided
+        run_stats = results.get("stats", {})
+        total_stats = get_store().stats()
+        st.caption(
+            f"Fetched {run_stats.get('fetches', 0)} detail pages, reused {run_stats.get('fetches_avoided', 0)} cached records "
+            f"and collapsed {run_stats.get('duplicates_collapsed', 0)} duplicate links. "
+            f"Fetches avoided since startup: {total_stats.get('fetches_avoided', 0) + total_stats.get('duplicates_collapsed', 0)}, "
+            f"plus {search_flight.stats()['coalesced']} identical searches and {detail_flight.stats()['coalesced']} detail fetches "
+            f"shared with concurrent requests."
+        )
+        transport = results.get("transport")
+        if transport:
+            st.caption(
+                f"Detail requests since startup: {transport.get('HTTP/2', 0)} over HTTP/2, {transport.get('HTTP/1.1', 0)} over HTTP/1.1 "
+                f"(server without HTTP/2), and {transport.get('fallbacks', 0)} retried over HTTP/1.1 after an HTTP/2 error."
+            )
+        if st.session_state.result_set.has_changes():
+            change_counts = st.session_state.result_set.change_counts()
+            st.caption(
+                f"Since the previous run of this search: {change_counts.get('added', 0)} added, "
+                f"{change_counts.get('changed', 0)} changed and {change_counts.get('removed', 0)} removed."
+            )
+        elif results.get("incomplete"):
+            st.caption("Some result pages could not be loaded, so changes since the previous run were not computed.")
         
-        if results["success"]:
-            st.session_state.results = results["data"]
-            st.success(f"Found {len(results['data'])} businesses.")
-        else:
-            st.error(results["message"])
+        # Show which selectors and extraction paths are currently tried first
+        with st.expander("Selector strategy hit rates"):
+            st.dataframe(strategies.stats(), use_container_width=True)
+    else:
+        st.error(results["message"])
 
 # Display results if available
-if st.session_state.results:
+if st.session_state.result_set is not None and len(st.session_state.result_set) > 0:
+    result_set = st.session_state.result_set
+    
     # Results container
     st.markdown("""
     <div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
         <h3 style="margin-top: 0; color: #0083B8;">Search Results</h3>
     """, unsafe_allow_html=True)
     
+    # Filter, sort and page on the server so only the visible window reaches the browser
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        filter_text = st.text_input("Filter Results", placeholder="Matches any column")
+    with col2:
+        sort_by = st.selectbox("Sort By", ["(original order)"] + RESULT_COLUMNS)
+    with col3:
+        page_size = st.selectbox("Rows per Page", [25, 50, 100], index=1)
+    descending = st.checkbox("Sort descending")
+    
+    total = result_set.count(filter_text)
+    page_count = max(1, (total + page_size - 1) // page_size)
+    page_number = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    page_rows = result_set.page((page_number - 1) * page_size, page_size, sort_by, descending, filter_text)
+    
     # Display as a table
-    st.dataframe(st.session_state.results, use_container_width=True)
+    st.dataframe([record for _, record in page_rows], use_container_width=True)
+    st.caption(f"Page {page_number} of {page_count} ({total} matching businesses)")
+    
+    # Fetch detail pages lazily for selected rows (e.g. after a list-only search).
+    # Like searches, this runs on the background executor so reruns don't interrupt it.
+    detail_job = executor.get(st.session_state.detail_job_id) if st.session_state.detail_job_id else None
+    if detail_job is not None and not detail_job.finished():
+        job_running = True
+        st.progress(min(detail_job.fraction, 1.0))
+        if detail_job.state == "queued":
+            st.text(f"Queued behind other searches (position {executor.queue_position(detail_job.id)})...")
+        else:
+            st.text(detail_job.message)
+        if st.button("Cancel Fetching Details"):
+            executor.cancel(detail_job.id)
+    else:
+        if detail_job is not None:
+            executor.pop(detail_job.id)
+            if not detail_job.result["success"]:
+                st.error(detail_job.result["message"])
+            elif detail_job.state == "cancelled":
+                st.warning(f"Fetching details cancelled. Updated {detail_job.result.get('updated', 0)} businesses.")
+            else:
+                st.success(f"Fetched details for {detail_job.result['updated']} businesses.")
+        st.session_state.detail_job_id = None
+        
+        page_records = dict(page_rows)
+        selected_rows = st.multiselect(
+            "Fetch details for selected businesses",
+            options=list(page_records),
+            format_func=lambda row_id: f"{page_records[row_id]['Business Name']} ({page_records[row_id]['Document Number']})"
+        )
+        if selected_rows and st.button("Fetch Details"):
+            detail_args = (result_set, [(row_id, page_records[row_id]) for row_id in selected_rows], incremental)
+            detail_job = executor.submit(owner, "Fetch details", lambda job, args=detail_args: run_details_job(job, fetch_details, *args))
+            st.session_state.detail_job_id = detail_job.id
+            st.rerun()
     
     st.markdown("</div>", unsafe_allow_html=True)
     
@@ -374,34 +547,65 @@ if st.session_state.results:
         <h3 style="margin-top: 0; color: #0083B8;">Export Options</h3>
     """, unsafe_allow_html=True)
     
-    col1, col2 = st.columns(2)
-    
-    # CSV export
-    with col1:
-        csv_data = convert_to_csv(st.session_state.results)
-        st.download_button(
-            label="Download CSV",
-            data=csv_data,
-            file_name=f"sunbiz_results_{search_term.replace(' ', '_')}.csv",
-            mime="text/csv",
-            key="csv_download",
-            help="Download results as CSV (compatible with Excel, Google Sheets, etc.)"
+    # Delta exports hold only what changed since the previous run of this search
+    changes_only = False
+    if result_set.has_changes():
+        changes_only = st.checkbox(
+            "Changes only",
+            help="Export only records added, changed or removed since the previous run of this search, with a Change Type column."
         )
     
-    # Excel export
-    with col2:
-        excel_data = convert_to_excel(st.session_state.results)
-        st.download_button(
-            label="Download Excel",
-            data=excel_data,
-            file_name=f"sunbiz_results_{search_term.replace(' ', '_')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            key="excel_download",
-            help="Download results as Excel spreadsheet"
-        )
+    export_format = st.selectbox(
+        "Export format",
+        list(EXPORT_FORMATS),
+        help="CSV opens in Excel, Google Sheets, etc.; JSONL has one record per line; Parquet suits data tools."
+    )
+    
+    # Exports stream the result set from disk into a file, so they are only built on request
+    if st.button("Prepare Export"):
+        if changes_only:
+            export_data = export_records(result_set.iter_changes(), export_format)
+            file_stem = f"sunbiz_changes_{search_term.replace(' ', '_')}"
+        else:
+            export_data = export_records(result_set.iter_records(), export_format)
+            file_stem = f"sunbiz_results_{search_term.replace(' ', '_')}"
+        
+        if export_data is None:
+            st.info("No changes since the previous run of this search.")
+        else:
+            extension, mime, _ = EXPORT_FORMATS[export_format]
+            st.download_button(
+                label=f"Download {export_format}",
+                data=export_data,
+                file_name=f"{file_stem}{extension}",
+                mime=mime,
+                key="export_download",
+                help=f"Download results as {export_format}"
+            )
     
     st.markdown("</div>", unsafe_allow_html=True)
 
+# Owner lookup: which scraped companies a person or registered agent is tied to
+st.markdown("""
+<div style="background-color: #f8f9fa; padding: 1.5rem; border-radius: 8px; border: 1px solid #e9ecef; margin-bottom: 2rem;">
+    <h3 style="margin-top: 0; color: #0083B8;">Owner Lookup</h3>
+""", unsafe_allow_html=True)
+
+person_name = st.text_input(
+    "Find companies by officer, authorized person or registered agent",
+    placeholder="e.g., Jane Doe",
+    help="Searches every detail page scraped so far. Case, punctuation and word order are ignored."
+)
+if person_name:
+    person_matches = get_store().lookup_person(person_name)
+    if person_matches:
+        st.dataframe(person_matches, use_container_width=True)
+        st.caption(f"{len({match['Document Number'] or match['Sunbiz URL'] for match in person_matches})} companies linked to {person_name}")
+    else:
+        st.info("No scraped companies list this name.")
+
+st.markdown("</div>", unsafe_allow_html=True)
+
 # Footer with disclaimer
 st.markdown("---")
 st.markdown("""
@@ -411,3 +615,8 @@ st.markdown("""
     <p><strong>Disclaimer:</strong> Please ensure your use complies with Sunbiz terms of service and applicable laws. This tool is for informational purposes only.</p>
 </div>
 """, unsafe_allow_html=True)
+
+# Poll the background job until it finishes
+if job_running:
+    time.sleep(1)
+    st.rerun()
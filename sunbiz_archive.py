@@ -0,0 +1,189 @@
+import argparse
+import calendar
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import zstandard
+from bs4 import BeautifulSoup
+from sunbiz_parse import extract_result_rows, make_detail_record, make_list_record, parse_detail_page
+from sunbiz_store import get_store
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; appends are then only serialized within a process
+    fcntl = None
+
+# Append-only archive of every fetched page, one zstd frame per page. An SQLite
+# index next to it maps each page to the offset and length of its frame.
+# Set SUNBIZ_ARCHIVE_PATH to an empty string to turn archiving off.
+ARCHIVE_PATH = os.environ.get("SUNBIZ_ARCHIVE_PATH", "sunbiz_archive.warc.zst")
+COMPRESSION_LEVEL = int(os.environ.get("SUNBIZ_ARCHIVE_LEVEL", "9"))
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frames_kind_url ON frames (kind, url);
+"""
+
+
+# Function to build a WARC-like record: header lines, a blank line, then the page body
+def make_frame_payload(url, kind, body, meta, fetched_at):
+    header = (
+        "WARC/1.0\r\n"
+        "WARC-Type: response\r\n"
+        f"WARC-Target-URI: {url}\r\n"
+        f"WARC-Date: {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(fetched_at))}\r\n"
+        f"X-Sunbiz-Kind: {kind}\r\n"
+        f"X-Sunbiz-Meta: {json.dumps(meta or {})}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    )
+    return header.encode("utf-8") + body
+
+
+# Function to split a decompressed record into its header fields and page body
+def split_frame_payload(payload):
+    head, _, body = payload.partition(b"\r\n\r\n")
+    header = {}
+    for line in head.decode("utf-8").split("\r\n")[1:]:
+        name, _, value = line.partition(": ")
+        header[name] = value
+    header["X-Sunbiz-Meta"] = json.loads(header.get("X-Sunbiz-Meta") or "{}")
+    return header, body
+
+
+class PageArchive:
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()  # A ZstdCompressor can't be shared between threads
+        self.index = sqlite3.connect(path + ".idx", check_same_thread=False)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.executescript(INDEX_SCHEMA)
+
+    # This thread's compressor
+    def compressor(self):
+        compressor = getattr(self.local, "compressor", None)
+        if compressor is None:
+            compressor = self.local.compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        return compressor
+
+    # Compress the page into its own frame and append it to the archive. Pages are
+    # compressed before taking the lock, so fetcher threads compress in parallel
+    # and only the file write and index insert are serialized.
+    def append(self, url, kind, body, meta=None):
+        fetched_at = time.time()
+        frame = self.compressor().compress(make_frame_payload(url, kind, body, meta, fetched_at))
+        with self.lock:
+            with open(self.path, "ab") as archive_file:
+                if fcntl is not None:
+                    fcntl.flock(archive_file, fcntl.LOCK_EX)
+                archive_file.seek(0, os.SEEK_END)
+                offset = archive_file.tell()
+                archive_file.write(frame)
+            self.index.execute(
+                "INSERT INTO frames (url, kind, fetched_at, offset, length) VALUES (?, ?, ?, ?, ?)",
+                (url, kind, fetched_at, offset, len(frame))
+            )
+            self.index.commit()
+
+    # (offset, length) of the latest capture of every page of the given kind
+    def latest_frames(self, kind):
+        with self.lock:
+            return self.index.execute(
+                "SELECT offset, length FROM frames WHERE id IN "
+                "(SELECT MAX(id) FROM frames WHERE kind = ? GROUP BY url) ORDER BY id",
+                (kind,)
+            ).fetchall()
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+# Process-wide archive instance, or None when archiving is turned off
+def get_archive():
+    global _archive
+    if not ARCHIVE_PATH:
+        return None
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive()
+        return _archive
+
+
+# Function to store a fetched page in the archive (no-op when archiving is off)
+def archive_page(url, kind, body, meta=None):
+    archive = get_archive()
+    if archive is not None:
+        archive.append(url, kind, body, meta)
+
+
+# Function run in a worker process: re-parse a batch of archived pages with the current extractor
+def reparse_batch(path, kind, frames):
+    results = []
+    decompressor = zstandard.ZstdDecompressor()
+    with open(path, "rb") as archive_file:
+        for offset, length in frames:
+            archive_file.seek(offset)
+            header, body = split_frame_payload(decompressor.decompress(archive_file.read(length)))
+            url = header.get("WARC-Target-URI", "")
+            meta = header["X-Sunbiz-Meta"]
+            fetched_at = calendar.timegm(time.strptime(header["WARC-Date"], "%Y-%m-%dT%H:%M:%SZ"))
+            if kind == "detail":
+                business_info = parse_detail_page(body)
+                record = make_detail_record(meta.get("name", ""), url, meta.get("status", ""), business_info)
+                results.append((url, record, meta, fetched_at, business_info["people"]))
+            else:
+                for row in extract_result_rows(BeautifulSoup(body, "html.parser")):
+                    results.append((row[1], make_list_record(*row), None, fetched_at, None))
+    return results
+
+
+# Function to re-run extraction over the whole archive in parallel, without touching the network
+def reparse_archive(path, kind="detail", workers=None, batch_size=200, output=sys.stdout, update_store=False):
+    frames = PageArchive(path).latest_frames(kind)
+    batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+    store = get_store() if update_store else None
+
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for results in pool.map(reparse_batch, itertools.repeat(path), itertools.repeat(kind), batches):
+            for url, record, meta, fetched_at, people in results:
+                output.write(json.dumps(record) + "\n")
+                if store is not None and kind == "detail":
+                    # Also rebuilds the entity's entries in the people index
+                    store.save(url, record, meta, scraped_at=fetched_at, people=people)
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline tools for the Sunbiz page archive.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    reparse = subcommands.add_parser("reparse", help="Re-run the current extractor over archived pages")
+    reparse.add_argument("--archive", default=ARCHIVE_PATH or "sunbiz_archive.warc.zst", help="Archive file to read")
+    reparse.add_argument("--kind", choices=["detail", "search"], default="detail", help="Which archived pages to re-parse")
+    reparse.add_argument("--workers", type=int, default=None, help="Parse processes (default: one per CPU)")
+    reparse.add_argument("--batch-size", type=int, default=200, help="Pages handed to a worker at a time")
+    reparse.add_argument("--output", default="-", help="JSONL file for the extracted records (default: stdout)")
+    reparse.add_argument("--update-store", action="store_true", help="Also replace the records (and people index) in the shared record store")
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started = time.time()
+    count = reparse_archive(args.archive, args.kind, args.workers, args.batch_size, output, args.update_store)
+    if output is not sys.stdout:
+        output.close()
+    print(f"Re-parsed {count} records in {time.time() - started:.1f}s", file=sys.stderr)
@@ -0,0 +1,73 @@
+import copy
+import threading
+
+
+# One in-flight call that concurrent callers wait on
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cut_short = False  # The leader was cancelled, so its result may be partial
+
+
+# Coalesces concurrent identical requests: the first caller for a key runs the
+# fetch, later callers with the same key wait for it and receive a copy of its result.
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.counters = {"executed": 0, "coalesced": 0, "rerun": 0}
+
+    # Run fn() once per key at a time. Waiting callers give up (returning None)
+    # if their cancel_event is set before the shared call finishes. If the caller
+    # running fn() was cancelled, its result may be partial, so waiting callers
+    # that still want the result run fn() again instead of taking it.
+    def do(self, key, fn, cancel_event=None):
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self.calls[key] = call
+                    self.counters["executed"] += 1
+                else:
+                    self.counters["coalesced"] += 1
+
+            if leader:
+                break
+
+            while not call.done.wait(0.5):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+            if call.cut_short:
+                with self.lock:
+                    self.counters["rerun"] += 1
+                continue
+            if call.error is not None:
+                raise call.error
+            # Each caller gets its own copy so results can be modified independently
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            call.cut_short = cancel_event is not None and cancel_event.is_set()
+            return call.result
+        except Exception as e:
+            call.error = e
+            call.cut_short = cancel_event is not None and cancel_event.is_set()
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+# Process-wide coalescing layers for searches and detail-page fetches
+search_flight = SingleFlight()
+detail_flight = SingleFlight()
@@ -0,0 +1,86 @@
+import csv
+import io
+import itertools
+import json
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+# Export formats for result sets, shared by both scrapers. Each writer takes an
+# iterable of records (e.g. ResultSet.iter_records()) and streams it into a file,
+# so only one chunk of records is held in memory while the export is built.
+
+# Records per Parquet row group
+PARQUET_CHUNK_SIZE = 1000
+
+
+# Function to write results as CSV
+def write_csv(columns, records, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+    writer.writerow(columns)
+    for record in records:
+        # Handle any special characters or encoding issues
+        writer.writerow([str(record.get(column) or "").replace('\r', ' ').replace('\n', ' ') for column in columns])
+    text.detach()
+
+
+# Function to write results as an Excel spreadsheet
+def write_excel(columns, records, out):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for record in records:
+        sheet.append([str(record.get(column) or "") for column in columns])
+    workbook.save(out)
+
+
+# Function to write results as JSON Lines (one record per line)
+def write_jsonl(columns, records, out):
+    for record in records:
+        out.write((json.dumps(record) + "\n").encode("utf-8"))
+
+
+# Function to write results as Parquet, one row group per chunk of records
+def write_parquet(columns, records, out):
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    writer = pq.ParquetWriter(out, schema)
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= PARQUET_CHUNK_SIZE:
+            writer.write_table(pa.Table.from_pylist(_as_strings(columns, chunk), schema=schema))
+            chunk = []
+    if chunk:
+        writer.write_table(pa.Table.from_pylist(_as_strings(columns, chunk), schema=schema))
+    writer.close()
+
+
+def _as_strings(columns, records):
+    return [{column: str(record.get(column) or "") for column in columns} for record in records]
+
+
+# Export formats offered in the UI: file extension, MIME type and writer
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv", write_csv),
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", write_excel),
+    "JSONL": (".jsonl", "application/x-ndjson", write_jsonl),
+    "Parquet": (".parquet", "application/vnd.apache.parquet", write_parquet),
+}
+
+
+# Build one export of the records in the given format. The records are written to
+# a temporary file on disk and the finished file's bytes are returned, or None
+# when there are no records.
+def export_records(records, export_format):
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return None
+    columns = list(first)
+    _, _, writer = EXPORT_FORMATS[export_format]
+    with tempfile.TemporaryFile() as out:
+        writer(columns, itertools.chain([first], records), out)
+        out.seek(0)
+        return out.read()
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import http.server
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+try:
+    import httpx
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError:  # Optional (httpx[http2]); detail pages then go over HTTP/1.1 with requests
+    httpx = None
+
+# Fetch detail pages over HTTP/2. Off by default; needs httpx[http2]
+HTTP2_ENABLED = os.environ.get("SUNBIZ_HTTP2", "0") == "1"
+
+# Connections opened to the server; HTTP/2 multiplexes many requests over each
+HTTP2_CONNECTIONS = int(os.environ.get("SUNBIZ_HTTP2_CONNECTIONS", "1"))
+
+# Requests in flight at once across those connections
+HTTP2_STREAMS = int(os.environ.get("SUNBIZ_HTTP2_STREAMS", "8"))
+
+# Connection-level headers that HTTP/2 does not allow
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"}
+
+
+# Thread-safe HTTP/2 client that multiplexes concurrent requests over a few
+# connections, with a cap on streams in flight. Servers that don't offer HTTP/2
+# are spoken to over HTTP/1.1, and requests that fail at the transport level
+# are retried once with the fallback session.
+#
+# Requests from all threads run on one event loop thread. httpcore's sync
+# HTTP/2 connection picks a stream ID and sends its headers without a lock, so
+# two threads starting requests at once can claim the same stream (seen as
+# LocalProtocolError "SEND_HEADERS in state 5", stream resets, and reads that
+# stall until the timeout). Its async connection sends the headers before
+# another request can start.
+class Http2Client:
+    def __init__(self, headers=None, connections=HTTP2_CONNECTIONS, max_streams=HTTP2_STREAMS, prior_knowledge=False):
+        self.max_streams = max_streams
+        self.streams = threading.BoundedSemaphore(max_streams)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.client = httpx.AsyncClient(
+            http1=not prior_knowledge,  # Prior knowledge: cleartext HTTP/2 without negotiation
+            http2=True,
+            headers={name: value for name, value in (headers or {}).items() if name.lower() not in HOP_BY_HOP_HEADERS},
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            timeout=30.0
+        )
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    # Response with status_code and content, like requests.Session.get
+    def get(self, url, fallback=None):
+        with self.streams:
+            try:
+                response = asyncio.run_coroutine_threadsafe(self.client.get(url), self.loop).result()
+            except httpx.TransportError:
+                if fallback is None:
+                    raise
+                self._count("fallbacks")
+                return fallback.get(url)
+        self._count(response.http_version)
+        return response
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# Process-wide HTTP/2 client, or None when HTTP/2 is off or httpx[http2] isn't installed
+def get_http2_client(headers=None):
+    global _client
+    if not HTTP2_ENABLED or httpx is None:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = Http2Client(headers)
+        return _client
+
+
+# Local cleartext HTTP/2 (h2c) server answering every request with body after
+# latency seconds. Streams on a connection are answered concurrently.
+def serve_h2c(listener, body, latency):
+    def handle(sock):
+        conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        lock = threading.Lock()
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+
+        def respond(stream_id):
+            with lock:
+                conn.send_headers(stream_id, [(":status", "200"), ("content-type", "text/html"), ("content-length", str(len(body)))])
+                frame_size = conn.max_outbound_frame_size
+                for start in range(0, len(body), frame_size):
+                    conn.send_data(stream_id, body[start:start + frame_size], end_stream=start + frame_size >= len(body))
+                sock.sendall(conn.data_to_send())
+
+        while True:
+            data = sock.recv(65535)
+            if not data:
+                break
+            with lock:
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        threading.Timer(latency, respond, (event.stream_id,)).start()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                sock.sendall(conn.data_to_send())
+
+    while True:
+        sock, _ = listener.accept()
+        threading.Thread(target=handle, args=(sock,), daemon=True).start()
+
+
+# Local HTTP/1.1 server with the same latency, for the baseline
+def make_http1_server(body, latency):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+
+# Function to time count GETs of url issued from workers threads through get(url)
+def time_requests(get, url, count, workers):
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(lambda _: get(url).status_code, range(count)))
+    if any(status != 200 for status in statuses):
+        raise RuntimeError("Benchmark request failed")
+    return time.time() - started
+
+
+# Compare HTTP/1.1 (requests) with multiplexed HTTP/2 (httpx) over the same
+# number of connections against local stub servers. Like the scraper with HTTP/2
+# on, streams fetchers issue the requests; the scraper's request rate limit
+# (SUNBIZ_FETCH_RATE) is left out so the transports themselves are compared.
+def run_benchmark(count, latency, connections, streams, body_size):
+    body = b"<html><body>" + b"x" * body_size + b"</body></html>"
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    threading.Thread(target=serve_h2c, args=(listener, body, latency), daemon=True).start()
+    http1_server = make_http1_server(body, latency)
+    threading.Thread(target=http1_server.serve_forever, daemon=True).start()
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=connections, pool_block=True)
+    session.mount("http://", adapter)
+    http1_url = f"http://127.0.0.1:{http1_server.server_address[1]}/detail"
+    http1_time = time_requests(session.get, http1_url, count, streams)
+
+    client = Http2Client(connections=connections, max_streams=streams, prior_knowledge=True)
+    http2_url = f"http://127.0.0.1:{listener.getsockname()[1]}/detail"
+    http2_time = time_requests(client.get, http2_url, count, streams)
+    client.close()
+
+    print(f"{count} requests, {latency * 1000:.0f} ms server latency, {connections} connection(s), {streams} concurrent requests")
+    print(f"HTTP/1.1 (requests): {http1_time:.2f}s, {count / http1_time:.1f} req/s")
+    stats = client.stats()
+    print(f"HTTP/2 (httpx):      {http2_time:.2f}s, {count / http2_time:.1f} req/s  "
+          f"({stats.get('HTTP/2', 0)} over HTTP/2, {stats.get('fallbacks', 0)} fallbacks)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the HTTP/2 detail transport against local stub servers.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per transport")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub server takes per request")
+    parser.add_argument("--connections", type=int, default=HTTP2_CONNECTIONS, help="Connections each transport may open")
+    parser.add_argument("--streams", type=int, default=HTTP2_STREAMS, help="Concurrent requests (HTTP/2 stream cap)")
+    parser.add_argument("--body-size", type=int, default=4096, help="Bytes in each response body")
+    args = parser.parse_args()
+
+    if httpx is None:
+        sys.exit("httpx[http2] is not installed")
+    run_benchmark(args.requests, args.latency, args.connections, args.streams, args.body_size)
@@ -0,0 +1,135 @@
+import collections
+import os
+import threading
+import time
+import uuid
+
+# Number of scrapes that may run at once across all users of this process
+MAX_WORKERS = int(os.environ.get("SUNBIZ_MAX_WORKERS", "2"))
+
+# Finished jobs are kept this long so results survive reruns and reconnects
+JOB_TTL = int(os.environ.get("SUNBIZ_JOB_TTL_MINUTES", "60")) * 60
+
+
+# A scrape running in the background. It is handed to the scraper in place of
+# Streamlit's status text and progress bar, so the UI can poll it across reruns.
+class Job:
+    def __init__(self, owner, label):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.label = label
+        self.state = "queued"  # queued, running, done, failed or cancelled
+        self.message = "Waiting for a free worker..."
+        self.fraction = 0.0
+        self.result = None
+        self.cancel_event = threading.Event()
+        self.finished_at = None
+
+    def text(self, message):
+        self.message = message
+
+    def progress(self, fraction):
+        self.fraction = fraction
+
+    def finished(self):
+        return self.state in ("done", "failed", "cancelled")
+
+
+# Process-wide executor with a bounded worker pool. Queued jobs are scheduled
+# round-robin across owners so one user's batch cannot starve everyone else.
+class JobExecutor:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.condition = threading.Condition()
+        self.queues = collections.OrderedDict()
+        self.jobs = {}
+        for _ in range(max_workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    # Queue fn(job) for owner and return the job; fn's return value becomes job.result
+    def submit(self, owner, label, fn):
+        job = Job(owner, label)
+        with self.condition:
+            self._prune()
+            self.jobs[job.id] = job
+            self.queues.setdefault(owner, collections.deque()).append((job, fn))
+            self.condition.notify()
+        return job
+
+    def get(self, job_id):
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    # Remove a finished job once its results have been collected
+    def pop(self, job_id):
+        with self.condition:
+            return self.jobs.pop(job_id, None)
+
+    # Ask a job to stop; a running scraper returns the results gathered so far
+    def cancel(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.cancel_event.set()
+            if job.state == "queued":
+                job.state = "cancelled"
+                job.message = "Cancelled before it started"
+                job.result = {"success": True, "data": [], "cancelled": True}
+                job.finished_at = time.time()
+
+    # 1-based position of a queued job in the round-robin schedule, 0 once it has started
+    def queue_position(self, job_id):
+        with self.condition:
+            queues = [list(queue) for queue in self.queues.values()]
+        position = 0
+        for round_index in range(max([len(queue) for queue in queues] or [0])):
+            for queue in queues:
+                if round_index < len(queue):
+                    position += 1
+                    if queue[round_index][0].id == job_id:
+                        return position
+        return 0
+
+    # Take the next job from the owner at the head of the rotation
+    def _next(self):
+        owner, queue = next(iter(self.queues.items()))
+        job, fn = queue.popleft()
+        del self.queues[owner]
+        if queue:
+            self.queues[owner] = queue
+        return job, fn
+
+    def _prune(self):
+        cutoff = time.time() - JOB_TTL
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.queues:
+                    self.condition.wait()
+                job, fn = self._next()
+                if job.state == "cancelled":
+                    continue
+                job.state = "running"
+            try:
+                job.result = fn(job)
+                job.state = "cancelled" if job.cancel_event.is_set() else "done"
+            except Exception as e:
+                job.result = {"success": False, "message": f"Error: {str(e)}"}
+                job.state = "failed"
+            job.finished_at = time.time()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Process-wide executor instance, shared across Streamlit reruns and sessions
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor()
+        return _executor
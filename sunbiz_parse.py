@@ -0,0 +1,333 @@
+import argparse
+import json
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+from sunbiz_store import normalize_url
+from sunbiz_strategies import strategies
+
+# HTML parsing for Sunbiz search result and detail pages. Kept free of Streamlit
+# so the scraper, its parse worker processes and the offline re-parse command
+# can all share it.
+
+# Document numbers shown on the result list (e.g. L21000123456, P97000012345)
+DOCUMENT_NUMBER_REGEX = re.compile(r'^[A-Z]{0,2}\d{4,12}$')
+
+# Function to read the document number from a result row
+def extract_row_document_number(cells):
+    for cell in cells:
+        text = cell.text.strip()
+        if DOCUMENT_NUMBER_REGEX.match(text):
+            return text
+    return ""
+
+# Candidate selectors for result links; the registry tries the recent winner first
+RESULT_LINK_SELECTORS = [
+    "table.search-results-table a",
+    "a.entity-name",
+    "table tr td:first-child a"
+]
+
+# Function to read (name, URL, status, document number) for every result row on a page
+def extract_result_rows(soup):
+    _, result_links = strategies.first_match("search_list", RESULT_LINK_SELECTORS, soup.select)
+    
+    rows = []
+    for link in result_links or []:
+        # Get business name and URL
+        business_name = link.text.strip()
+        detail_url = normalize_url(link.get('href'))
+        if not detail_url:
+            continue
+        
+        # Get status and document number if available
+        status = "Active"  # Default
+        document_number = ""
+        try:
+            # Try to find status in the same row
+            parent_row = link.find_parent('tr' )
+            if parent_row:
+                status_cell = parent_row.find_all('td')
+                if len(status_cell) > 1:
+                    status = status_cell[1].text.strip()
+                document_number = extract_row_document_number(status_cell)
+        except Exception:
+            pass  # Use default status if not found
+        
+        rows.append((business_name, detail_url, status, document_number))
+    return rows
+
+# Incremental parser for result list pages. Chunks are fed in as they download
+# and each result row is available as soon as its table row closes, so detail
+# fetches can start before the rest of the page has arrived.
+class ResultListParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []  # (name, URL, status, document number) not yet taken
+        self.rows_seen = 0
+        self.next_url = ""
+        self.no_results = False
+        self.recent_text = ""  # Tail of the text so far, for phrases split across chunks
+        self.row = None  # cells of the open <tr>
+        self.cell = None
+        self.link = None
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "tr":
+            self._close_row()
+            self.row = []
+        elif tag == "td" and self.row is not None:
+            self.cell = {"text": [], "links": []}
+            self.row.append(self.cell)
+        elif tag == "a":
+            self.link = {
+                "href": attrs.get("href") or "",
+                "text": [],
+                "entity": "entity-name" in (attrs.get("class") or "").split(),
+                "pager": (attrs.get("title") or "").startswith("Next")
+            }
+    
+    def handle_data(self, data):
+        self.recent_text = (self.recent_text + data)[-64:]
+        if "No Results Found" in self.recent_text or "No records found" in self.recent_text:
+            self.no_results = True
+        if self.link is not None:
+            self.link["text"].append(data)
+        if self.cell is not None:
+            self.cell["text"].append(data)
+    
+    def handle_endtag(self, tag):
+        if tag == "a" and self.link is not None:
+            self.link["text"] = "".join(self.link["text"]).strip()
+            # The pager sits outside the result table ("Next List", titled "Next On
+            # List"); a result cell linking e.g. "Next Step Realty" is a business
+            if self.link["pager"] or ("Next" in self.link["text"] and self.cell is None):
+                self.next_url = self.next_url or normalize_url(self.link["href"])
+            elif self.cell is not None:
+                self.cell["links"].append(self.link)
+            self.link = None
+        elif tag == "td":
+            self.cell = None
+        elif tag in ("tr", "table"):
+            self._close_row()
+    
+    # A row is a result when its first cell (or an entity-name link) links to a detail page
+    def _close_row(self):
+        cells, self.row, self.cell = self.row, None, None
+        if not cells:
+            return
+        links = cells[0]["links"] or [link for cell in cells for link in cell["links"] if link["entity"]]
+        detail_url = normalize_url(links[0]["href"]) if links else ""
+        if not detail_url:
+            return
+        texts = ["".join(cell["text"]).strip() for cell in cells]
+        status = texts[1] if len(texts) > 1 else "Active"
+        document_number = next((text for text in texts if DOCUMENT_NUMBER_REGEX.match(text)), "")
+        self.rows.append((links[0]["text"], detail_url, status, document_number))
+        self.rows_seen += 1
+    
+    # Return the rows parsed since the last call
+    def take_rows(self):
+        rows, self.rows = self.rows, []
+        return rows
+    
+    def close(self):
+        super().close()
+        self._close_row()
+
+# Function to find the link to the next page of results, skipping result links
+# whose business name happens to contain "Next"
+def find_next_page_url(soup):
+    for next_link in soup.find_all('a', string=re.compile("Next")):
+        if next_link.get('href') and (next_link.get('title', '').startswith("Next") or not next_link.find_parent('td')):
+            return normalize_url(next_link.get('href'))
+    return ""
+
+# Function to build a result record from list-level fields only
+def make_list_record(business_name, detail_url, status, document_number):
+    return {
+        "Business Name": business_name,
+        "Status": status,
+        "Document Number": document_number,
+        "FEI/EIN Number": "",
+        "Owner Name": "",
+        "Owner Title": "",
+        "Owner Email": "",
+        "Address": "",
+        "Filing Date": "",
+        "Sunbiz URL": detail_url
+    }
+
+# Function to build a result record from a parsed detail page
+def make_detail_record(business_name, detail_url, status, business_info):
+    return {
+        "Business Name": business_name,
+        "Status": status,
+        "Document Number": business_info.get("document_number", ""),
+        "FEI/EIN Number": business_info.get("fei_number", ""),
+        "Owner Name": business_info.get("owner_name", ""),
+        "Owner Title": business_info.get("owner_title", ""),
+        "Owner Email": business_info.get("owner_email", ""),
+        "Address": business_info.get("address", ""),
+        "Filing Date": business_info.get("filing_date", ""),
+        "Sunbiz URL": detail_url
+    }
+
+# Function to tell whether an officer title names the company's head (Sunbiz
+# abbreviates, e.g. "P" or "PRES" for President)
+def is_chief_title(title):
+    title = title.lower()
+    return title in ("p", "pres") or ("president" in title and "vice" not in title) or "ceo" in title or "chief executive" in title
+
+# Owner sections on a detail page, in probe order. Which one is filled depends on
+# the entity type (corporations list officers, LLCs authorized persons), not on
+# the page layout, so the order is fixed.
+OWNER_SECTIONS = ["officer", "authorized", "agent"]
+
+# Function to pick the owner (name, title) from a detail page's people: a
+# President/CEO, else the first person in the first filled owner section
+def pick_owner(people):
+    for role in OWNER_SECTIONS:
+        in_role = [person for person in people if person["role"] == role]
+        owner = next((person for person in in_role if is_chief_title(person["title"])), None) or next(iter(in_role), None)
+        if owner:
+            return owner["name"], owner["title"]
+    return "", ""
+
+# Function to parse a raw detail page into business details
+def parse_detail_page(html):
+    return extract_business_details(BeautifulSoup(html, 'html.parser'))
+
+# Function to extract business details from detail page
+def extract_business_details(soup):
+    # Extract document number
+    doc_number = ""
+    doc_label = soup.find(string=re.compile("Document Number"))
+    if doc_label:
+        doc_element = doc_label.find_parent().find_next_sibling()
+        if doc_element:
+            doc_number = doc_element.text.strip()
+    
+    # Extract FEI/EIN Number
+    fei_number = ""
+    fei_label = soup.find(string=re.compile("FEI/EIN Number"))
+    if fei_label:
+        fei_element = fei_label.find_parent().find_next_sibling()
+        if fei_element:
+            fei_number = fei_element.text.strip()
+    
+    # Extract filing date
+    filing_date = ""
+    date_label = soup.find(string=re.compile("Date Filed"))
+    if date_label:
+        date_element = date_label.find_parent().find_next_sibling()
+        if date_element:
+            filing_date = date_element.text.strip()
+    
+    # Extract principal address
+    address = ""
+    address_label = soup.find(string=re.compile("Principal Address"))
+    if address_label:
+        address_element = address_label.find_parent()
+        if address_element:
+            next_elements = address_element.find_next_siblings()
+            for element in next_elements:
+                if "Mailing Address" in element.text or "Registered Agent" in element.text:
+                    break
+                if element.text.strip():
+                    address += element.text.strip() + ", "
+            address = address.rstrip(", ")
+    
+    # Collect every officer, authorized person and registered agent for the people index
+    people = extract_people(soup)
+    
+    # Extract owner information - prioritize President/CEO
+    owner_name, owner_title = pick_owner(people)
+    
+    # Extract email - look throughout the page
+    owner_email = ""
+    email_regex = r'[\w.+-]+@[\w-]+\.[\w.-]+'
+    page_text = soup.get_text()
+    email_matches = re.findall(email_regex, page_text)
+    
+    if email_matches:
+        # Filter out common false positives
+        filtered_emails = [email for email in email_matches if 
+                          not email.endswith('@sunbiz.org') and 
+                          not email.endswith('@dos.myflorida.com') and
+                          not email.endswith('@leg.state.fl.us') and
+                          not 'example.com' in email and
+                          not 'domain.com' in email]
+        
+        if filtered_emails:
+            owner_email = filtered_emails[0]
+    
+    return {
+        "document_number": doc_number,
+        "fei_number": fei_number,
+        "owner_name": owner_name,
+        "owner_title": owner_title,
+        "owner_email": owner_email,
+        "address": address,
+        "filing_date": filing_date,
+        "people": people
+    }
+
+# Section headings on a detail page. Annual Reports and Document Images hold
+# tables too, so people are only read from the sections that list them.
+DETAIL_SECTION_REGEX = re.compile("Officer/Director|Authorized Person|Annual Reports|Document Images|Registered Agent|Principal Address|Mailing Address|Filing Information")
+PEOPLE_SECTION_REGEX = re.compile("Officer/Director|Authorized Person")
+
+# Function to read the people listed after an officer or authorized person heading.
+# Sunbiz lists each one as a "Title X" line followed by the name and an address
+# block; older layouts used a table of (name, title) rows.
+def extract_section_people(heading, role):
+    people = []
+    title = None
+    for element in heading.find_parent().next_siblings:
+        text = (element.get_text("\n") if hasattr(element, "get_text") else str(element)).strip()
+        if not text:
+            continue
+        if DETAIL_SECTION_REGEX.search(text):
+            break  # The next section, when sections aren't wrapped in their own element
+        if getattr(element, "name", None) == "table":
+            for row in element.find_all('tr'):
+                cells = row.find_all('td')
+                if len(cells) >= 2 and cells[0].text.strip():
+                    people.append({"name": cells[0].text.strip(), "title": cells[1].text.strip(), "role": role})
+        elif text.startswith("Title "):
+            title = text[len("Title "):].strip()
+        elif title is not None:
+            people.append({"name": text.split("\n")[0].strip(), "title": title, "role": role})
+            title = None  # What follows the name is its address
+    return people
+
+# Function to extract all officers, authorized persons and the registered agent as
+# {"name", "title", "role"} dicts, role being officer, authorized or agent
+def extract_people(soup):
+    people = []
+    for heading in soup.find_all(string=PEOPLE_SECTION_REGEX):
+        role = "authorized" if "Authorized Person" in heading else "officer"
+        people.extend(extract_section_people(heading, role))
+    
+    agent_label = soup.find(string=re.compile("Registered Agent"))
+    if agent_label:
+        for element in agent_label.find_parent().find_next_siblings():
+            text = element.get_text("\n").strip()
+            if "Officer/Director" in text or "Authorized Person" in text:
+                break
+            if text and text != "Name & Address":
+                people.append({"name": text.split("\n")[0].strip(), "title": "Registered Agent", "role": "agent"})
+                break
+    return people
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print what the extractor reads from saved Sunbiz detail pages.")
+    parser.add_argument("pages", nargs="+", help="Saved detail page HTML files (e.g. fixtures/*.html)")
+    args = parser.parse_args()
+
+    for path in args.pages:
+        with open(path, "rb") as page_file:
+            print(json.dumps({"page": path, **parse_detail_page(page_file.read())}))
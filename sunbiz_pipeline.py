@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Threads fetching pages concurrently for one scrape
+FETCH_WORKERS = int(os.environ.get("SUNBIZ_FETCH_WORKERS", "2"))
+
+# Detail requests started per second by one scrape's fetchers combined, so the
+# load on the server doesn't grow with the number of fetchers
+FETCH_RATE = float(os.environ.get("SUNBIZ_FETCH_RATE", str(FETCH_WORKERS)))
+
+# Processes parsing fetched pages, shared by all scrapes in this server
+PARSE_WORKERS = int(os.environ.get("SUNBIZ_PARSE_WORKERS", str(os.cpu_count() or 2)))
+
+# Fetched pages waiting to be parsed; fetchers block when it is full
+QUEUE_SIZE = int(os.environ.get("SUNBIZ_PARSE_QUEUE_SIZE", "16"))
+
+_DONE = object()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Process-wide parse pool. Streamlit runs the app script as __main__, which
+# spawned workers would re-execute on startup, so workers are forked where possible.
+def get_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+            _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=context)
+        return _pool
+
+
+# Replace the pool after a worker died (e.g. killed for memory on a huge page).
+# A broken pool rejects every submit, so without this parsing would stay down
+# for all sessions until the server restarts.
+def reset_parse_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+# Submit parse(raw) to the shared pool, rebuilding the pool once if it is broken
+def submit_parse(parse, raw):
+    pool = get_parse_pool()
+    try:
+        return pool.submit(parse, raw)
+    except BrokenProcessPool:
+        reset_parse_pool(pool)
+        return get_parse_pool().submit(parse, raw)
+
+
+# Spaces out calls from any number of threads to at most rate per second
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_start = time.monotonic()
+
+    # Block until the caller's turn
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next_start, now)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# Run fetch(item) on fetcher threads and parse(raw) in the parse pool. Fetchers
+# hand raw bytes over a bounded queue, so they stall instead of buffering pages
+# when parsing falls behind. on_result(item, parsed, error) is called on the
+# calling thread as each item finishes; items whose fetch returns None are
+# reported with parsed=None. items may be a lazy iterator; if it raises, no
+# more items are started and the error is raised here once the items already
+# fetched have been reported. If on_result raises, the fetchers stop and the
+# error is raised here.
+def run_pipeline(items, fetch, parse, on_result, cancel_event=None, fetch_workers=FETCH_WORKERS, queue_size=QUEUE_SIZE):
+    items = iter(items)
+    items_lock = threading.Lock()
+    fetched = queue.Queue(maxsize=queue_size)
+    items_errors = []
+    stopped = threading.Event()  # Set once this call returns or raises
+
+    def stopping():
+        return stopped.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+    def next_item():
+        with items_lock:
+            if items_errors or stopping():
+                return _DONE
+            try:
+                return next(items, _DONE)
+            except Exception as e:
+                items_errors.append(e)
+                return _DONE
+
+    # Queue an entry for the calling thread, giving up once it has stopped reading
+    def hand_over(entry):
+        while not stopped.is_set():
+            try:
+                fetched.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def fetcher():
+        try:
+            while True:
+                item = next_item()
+                if item is _DONE:
+                    break
+                try:
+                    entry = (item, fetch(item), None)
+                except Exception as e:
+                    entry = (item, None, e)
+                hand_over(entry)
+        finally:
+            hand_over(_DONE)
+            if stopping():
+                # Nobody reads further; release a lazy item source (e.g. a half-read result page)
+                with items_lock:
+                    close = getattr(items, "close", None)
+                    if close is not None:
+                        close()
+
+    threads = [threading.Thread(target=fetcher, daemon=True) for _ in range(fetch_workers)]
+    for thread in threads:
+        thread.start()
+
+    in_flight = {}  # future -> (item, raw, whether it was already resubmitted)
+    running_fetchers = len(threads)
+
+    def collect(futures):
+        for future in futures:
+            item, raw, retried = in_flight.pop(future)
+            try:
+                parsed, error = future.result(), None
+            except BrokenProcessPool as e:
+                # The worker died mid-parse; retry once (submit_parse replaces the broken pool)
+                if not retried:
+                    in_flight[submit_parse(parse, raw)] = (item, raw, True)
+                    continue
+                parsed, error = None, e
+            except Exception as e:
+                parsed, error = None, e
+            on_result(item, parsed, error)
+
+    try:
+        # Keep at most one parse per worker in flight so the bounded queue applies backpressure
+        while running_fetchers or in_flight:
+            if running_fetchers and len(in_flight) < PARSE_WORKERS:
+                try:
+                    entry = fetched.get(timeout=0.1)
+                except queue.Empty:
+                    entry = None
+                if entry is _DONE:
+                    running_fetchers -= 1
+                elif entry is not None:
+                    item, raw, error = entry
+                    if error is not None or raw is None:
+                        on_result(item, None, error)
+                    else:
+                        in_flight[submit_parse(parse, raw)] = (item, raw, False)
+                collect([future for future in list(in_flight) if future.done()])
+            else:
+                done, _ = wait(list(in_flight), timeout=0.1, return_when=FIRST_COMPLETED)
+                collect(done)
+    finally:
+        # Stop the fetchers, even when on_result raised, and drop the work they left
+        stopped.set()
+        for future in in_flight:
+            future.cancel()
+        while True:
+            try:
+                fetched.get_nowait()
+            except queue.Empty:
+                break
+
+    if items_errors:
+        raise items_errors[0]
@@ -0,0 +1,169 @@
+import glob
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from sunbiz_store import CHANGE_TYPE_COLUMN
+
+# Directory holding one SQLite file per session's result set
+RESULTS_DIR = os.environ.get("SUNBIZ_RESULTS_DIR", os.path.join(tempfile.gettempdir(), "sunbiz_results"))
+
+# Result files untouched for this long belong to ended sessions and are removed
+RESULTS_TTL = int(os.environ.get("SUNBIZ_RESULTS_TTL_HOURS", "24")) * 3600
+
+RESULT_COLUMNS = [
+    "Business Name",
+    "Status",
+    "Document Number",
+    "FEI/EIN Number",
+    "Owner Name",
+    "Owner Title",
+    "Owner Email",
+    "Address",
+    "Filing Date",
+    "Sunbiz URL"
+]
+
+_QUOTED_COLUMNS = ", ".join(f'"{column}"' for column in RESULT_COLUMNS)
+
+# Columns of the changes table: the change type, then the record
+CHANGE_COLUMNS = [CHANGE_TYPE_COLUMN] + RESULT_COLUMNS
+_QUOTED_CHANGE_COLUMNS = ", ".join(f'"{column}"' for column in CHANGE_COLUMNS)
+
+
+# Remove result files left behind by sessions that have ended
+def prune_result_sets():
+    cutoff = time.time() - RESULTS_TTL
+    for path in glob.glob(os.path.join(RESULTS_DIR, "*.db")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+# A session's result set kept on disk. The UI reads one filtered, sorted page at
+# a time, so per-session memory does not grow with the number of results.
+class ResultSet:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(f'"{column}" TEXT' for column in RESULT_COLUMNS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, {columns})")
+
+    # Create a new result set on disk holding the given records, plus the
+    # records that changed since the previous run of the search when known
+    @classmethod
+    def create(cls, records, changes=None):
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        prune_result_sets()
+        result_set = cls(os.path.join(RESULTS_DIR, uuid.uuid4().hex + ".db"))
+        result_set.extend(records)
+        if changes is not None:
+            result_set.set_changes(changes)
+        return result_set
+
+    def extend(self, records):
+        placeholders = ", ".join("?" for _ in RESULT_COLUMNS)
+        with self.lock:
+            self.conn.executemany(
+                f"INSERT INTO results ({_QUOTED_COLUMNS}) VALUES ({placeholders})",
+                ([str(record.get(column, "") or "") for column in RESULT_COLUMNS] for record in records)
+            )
+            self.conn.commit()
+
+    def update(self, row_id, record):
+        assignments = ", ".join(f'"{column}" = ?' for column in RESULT_COLUMNS)
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE results SET {assignments} WHERE id = ?",
+                [str(record.get(column, "") or "") for column in RESULT_COLUMNS] + [row_id]
+            )
+            self.conn.commit()
+
+    # WHERE clause matching filter_text against any column
+    def _where(self, filter_text):
+        if not filter_text:
+            return "", []
+        clause = " OR ".join(f'"{column}" LIKE ?' for column in RESULT_COLUMNS)
+        return f"WHERE {clause}", [f"%{filter_text}%"] * len(RESULT_COLUMNS)
+
+    def count(self, filter_text=""):
+        where, params = self._where(filter_text)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM results {where}", params).fetchone()[0]
+
+    # Return (row id, record) pairs for one page of the filtered, sorted results
+    def page(self, offset, limit, sort_by=None, descending=False, filter_text=""):
+        where, params = self._where(filter_text)
+        order = "id"
+        if sort_by in RESULT_COLUMNS:
+            order = f'"{sort_by}" {"DESC" if descending else "ASC"}, id'
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, {_QUOTED_COLUMNS} FROM results {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [(row[0], dict(zip(RESULT_COLUMNS, row[1:]))) for row in rows]
+
+    # Yield every record in insertion order, reading from disk in chunks
+    def iter_records(self, chunk_size=1000):
+        offset = 0
+        while True:
+            rows = self.page(offset, chunk_size)
+            if not rows:
+                return
+            for _, record in rows:
+                yield record
+            offset += chunk_size
+
+    # Store the added, changed and removed records (tagged with a change type)
+    def set_changes(self, changes):
+        columns = ", ".join(f'"{column}" TEXT' for column in CHANGE_COLUMNS)
+        placeholders = ", ".join("?" for _ in CHANGE_COLUMNS)
+        with self.lock:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS changes (id INTEGER PRIMARY KEY, {columns})")
+            self.conn.executemany(
+                f"INSERT INTO changes ({_QUOTED_CHANGE_COLUMNS}) VALUES ({placeholders})",
+                ([str(record.get(column, "") or "") for column in CHANGE_COLUMNS] for record in changes)
+            )
+            self.conn.commit()
+
+    # Whether changes since the previous run were computed for this result set
+    def has_changes(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'changes'").fetchone() is not None
+
+    # Number of changed records by change type
+    def change_counts(self):
+        with self.lock:
+            return dict(self.conn.execute(f'SELECT "{CHANGE_TYPE_COLUMN}", COUNT(*) FROM changes GROUP BY 1'))
+
+    # Yield every changed record in order, reading from disk in chunks
+    def iter_changes(self, chunk_size=1000):
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT id, {_QUOTED_CHANGE_COLUMNS} FROM changes WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(CHANGE_COLUMNS, row[1:]))
+            last_id = rows[-1][0]
+
+    def __len__(self):
+        return self.count()
+
+    def delete(self):
+        with self.lock:
+            self.conn.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,55 @@
+import json
+from sunbiz_coalesce import search_flight
+from sunbiz_store import get_store
+
+# Background search jobs, shared by both scrapers. Each app passes in its own
+# search function with the signature of search_sunbiz.
+
+
+# Function to compare a finished search with the previous run of the same query,
+# keeping only the added, changed and removed records for delta exports.
+# Cancelled runs, and runs that lost a result page, miss rows for reasons other
+# than removal, so they do not replace the snapshot. Records whose detail fetch
+# failed (results["failed_urls"]) keep their previous snapshot entry.
+def attach_delta(results, snapshot_key, cancel_event):
+    if results["success"] and not cancel_event.is_set() and not results.get("incomplete"):
+        results["delta"] = get_store().diff_snapshot(snapshot_key, results["data"], results.get("failed_urls", []))
+    return results
+
+
+# Function to run a search as a background job. Identical searches running at the
+# same time (other users or tabs) share one scrape and all receive its results.
+def run_search_job(job, search, search_type, search_term, max_results, incremental, list_only):
+    search_key = (search_type, search_term.strip().lower(), max_results, incremental, list_only)
+    snapshot_key = json.dumps([search_type, search_term.strip().lower(), max_results, list_only])
+    job.text("Waiting for an identical search already in progress...")
+    results = search_flight.do(
+        search_key,
+        lambda: attach_delta(
+            search(search_type, search_term, max_results, job, job, incremental, list_only, job.cancel_event),
+            snapshot_key,
+            job.cancel_event
+        ),
+        job.cancel_event
+    )
+    return results or {"success": True, "data": [], "stats": {}}
+
+
+# Function to fetch detail pages for selected rows of a result set as a background
+# job. selected holds (row id, record) pairs; each row is replaced by its detailed
+# record once fetched. fetch_details is the app's own detail fetcher.
+def run_details_job(job, fetch_details, result_set, selected, incremental):
+    rows = [
+        (record["Business Name"], record["Sunbiz URL"], record["Status"], record["Document Number"])
+        for _, record in selected
+    ]
+    details = fetch_details(rows, job, job, incremental, cancel_event=job.cancel_event)
+    
+    # Replace the selected rows with their detailed records
+    detailed = {record["Sunbiz URL"]: record for record in details["data"]}
+    updated = 0
+    for row_id, record in selected:
+        if record["Sunbiz URL"] in detailed:
+            result_set.update(row_id, detailed[record["Sunbiz URL"]])
+            updated += 1
+    return {"success": True, "data": [], "updated": updated}
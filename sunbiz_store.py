@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Location of the shared record store (shared by both scrapers and all sessions)
+STORE_PATH = os.environ.get("SUNBIZ_STORE_PATH", "sunbiz_store.db")
+
+# Records scraped within this window are reused instead of refetched
+FRESHNESS_WINDOW = int(os.environ.get("SUNBIZ_FRESHNESS_HOURS", "24")) * 3600
+
+# In incremental refresh mode, unchanged records are reused up to this age
+INCREMENTAL_MAX_AGE = int(os.environ.get("SUNBIZ_MAX_AGE_DAYS", "30")) * 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    detail_url TEXT PRIMARY KEY,
+    document_number TEXT,
+    record TEXT NOT NULL,
+    list_meta TEXT,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_document_number ON records (document_number);
+CREATE TABLE IF NOT EXISTS people (
+    entity_key TEXT,
+    detail_url TEXT NOT NULL,
+    document_number TEXT,
+    business_name TEXT,
+    name TEXT NOT NULL,
+    normalized_name TEXT NOT NULL,
+    title TEXT,
+    role TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS people_normalized_name ON people (normalized_name);
+CREATE TABLE IF NOT EXISTS snapshots (
+    query_key TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (query_key, record_key)
+);
+"""
+
+# Column added to delta exports: "added", "changed" or "removed"
+CHANGE_TYPE_COLUMN = "Change Type"
+
+
+# Metadata shown for an entity on the search result list, used to detect changes
+def make_list_meta(business_name, status, document_number):
+    return {"name": business_name, "status": status, "document_number": document_number}
+
+
+# Normalize a detail URL so the same entity always maps to the same key
+def normalize_url(url):
+    url = (url or "").strip()
+    if url and not url.startswith("http"):
+        url = "https://search.sunbiz.org" + url
+    return url
+
+
+# Normalize a person or agent name for the people index: case, punctuation and
+# word order are ignored, so "DOE, JANE" and "Jane Doe" match
+def normalize_person_name(name):
+    return " ".join(sorted(re.sub(r"[^\w\s]", " ", name or "").upper().split()))
+
+
+# Key identifying the same entity across runs of a query
+def snapshot_record_key(record):
+    return record.get("Document Number") or normalize_url(record.get("Sunbiz URL", ""))
+
+
+# Hash of a record's content, used to tell changed records from unchanged ones
+def record_hash(record):
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Persistent store of scraped records keyed by detail URL and document number
+class RecordStore:
+    def __init__(self, path=STORE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(records)")]
+        if "list_meta" not in columns:
+            self.conn.execute("ALTER TABLE records ADD COLUMN list_meta TEXT")
+        # People are keyed by entity (detail URLs change with the search that found it)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(people)")]
+        if "entity_key" not in columns:
+            self.conn.execute("ALTER TABLE people ADD COLUMN entity_key TEXT")
+            self.conn.execute("UPDATE people SET entity_key = COALESCE(NULLIF(document_number, ''), detail_url)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS people_entity_key ON people (entity_key)")
+        self.conn.commit()
+        self.counters = {"fetches_avoided": 0, "duplicates_collapsed": 0, "fetches": 0}
+
+    # Return the stored record if it was scraped within max_age seconds.
+    # When list_meta is given, the record is only reused if the metadata shown
+    # on the result list (name, status, document number) is unchanged.
+    def lookup(self, detail_url="", document_number="", max_age=FRESHNESS_WINDOW, list_meta=None):
+        cutoff = time.time() - max_age
+        with self.lock:
+            row = None
+            if document_number:
+                row = self.conn.execute(
+                    "SELECT record, list_meta FROM records WHERE document_number = ? AND scraped_at >= ? "
+                    "ORDER BY scraped_at DESC LIMIT 1",
+                    (document_number, cutoff)
+                ).fetchone()
+            if row is None and detail_url:
+                row = self.conn.execute(
+                    "SELECT record, list_meta FROM records WHERE detail_url = ? AND scraped_at >= ?",
+                    (normalize_url(detail_url), cutoff)
+                ).fetchone()
+        if row is None:
+            return None
+        if list_meta is not None and json.loads(row[1] or "null") != list_meta:
+            return None
+        return json.loads(row[0])
+
+    # Save a scraped record. When people (officers, authorized persons and the
+    # registered agent from the detail page) are given, they replace the
+    # entity's entries in the people index, whichever search URL they were
+    # saved under. Entities are keyed by document number, or by URL without one.
+    def save(self, detail_url, record, list_meta=None, scraped_at=None, people=None):
+        detail_url = normalize_url(detail_url)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO records (detail_url, document_number, record, list_meta, scraped_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (detail_url, record.get("Document Number", ""), json.dumps(record),
+                 json.dumps(list_meta) if list_meta is not None else None, scraped_at or time.time())
+            )
+            if people is not None:
+                # The same person can be listed twice (e.g. a repeated row); index them once
+                entries = dict.fromkeys(
+                    (person["name"], person.get("title", ""), person["role"])
+                    for person in people if normalize_person_name(person["name"])
+                )
+                entity_key = record.get("Document Number") or detail_url
+                self.conn.execute("DELETE FROM people WHERE entity_key = ?", (entity_key,))
+                self.conn.executemany(
+                    "INSERT INTO people (entity_key, detail_url, document_number, business_name, name, normalized_name, title, role) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (entity_key, detail_url, record.get("Document Number", ""), record.get("Business Name", ""),
+                         name, normalize_person_name(name), title, role)
+                        for name, title, role in entries
+                    ]
+                )
+            self.conn.commit()
+
+    # Entities a person or registered agent is tied to, found through the name index
+    def lookup_person(self, name, limit=500):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, title, role, business_name, document_number, detail_url FROM people "
+                "WHERE normalized_name = ? ORDER BY business_name LIMIT ?",
+                (normalize_person_name(name), limit)
+            ).fetchall()
+        return [
+            {"Person": row[0], "Title": row[1], "Role": row[2], "Business Name": row[3], "Document Number": row[4], "Sunbiz URL": row[5]}
+            for row in rows
+        ]
+
+    # Compare records with the previous snapshot for query_key, replace that
+    # snapshot with them and return only the added, changed and removed records,
+    # each tagged with a change type. Only hashes of the previous snapshot are
+    # read, plus the stored copies of removed records. Records whose detail URL
+    # is in failed_urls couldn't be fetched this run; they keep their previous
+    # entry instead of being reported as removed.
+    def diff_snapshot(self, query_key, records, failed_urls=()):
+        current = {}
+        for record in records:
+            key = snapshot_record_key(record)
+            if key:
+                current[key] = (record_hash(record), record)
+        
+        with self.lock:
+            previous = dict(self.conn.execute(
+                "SELECT record_key, content_hash FROM snapshots WHERE query_key = ?", (query_key,)
+            ))
+            failed_urls = {normalize_url(url) for url in failed_urls}
+            removed = []
+            for key in previous:
+                if key in current:
+                    continue
+                record = json.loads(self.conn.execute(
+                    "SELECT record FROM snapshots WHERE query_key = ? AND record_key = ?", (query_key, key)
+                ).fetchone()[0])
+                if normalize_url(record.get("Sunbiz URL", "")) in failed_urls:
+                    current[key] = (previous[key], record)
+                else:
+                    removed.append(record)
+            self.conn.execute("DELETE FROM snapshots WHERE query_key = ?", (query_key,))
+            self.conn.executemany(
+                "INSERT INTO snapshots (query_key, record_key, content_hash, record) VALUES (?, ?, ?, ?)",
+                ((query_key, key, content_hash, json.dumps(record)) for key, (content_hash, record) in current.items())
+            )
+            self.conn.commit()
+        
+        delta = []
+        for key, (content_hash, record) in current.items():
+            if key not in previous:
+                delta.append({CHANGE_TYPE_COLUMN: "added", **record})
+            elif previous[key] != content_hash:
+                delta.append({CHANGE_TYPE_COLUMN: "changed", **record})
+        delta.extend({CHANGE_TYPE_COLUMN: "removed", **record} for record in removed)
+        return delta
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Process-wide store instance, shared across Streamlit reruns and sessions
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecordStore()
+        return _store
@@ -0,0 +1,89 @@
+import collections
+import os
+import threading
+
+# Outcomes remembered per strategy for ranking. Only recent outcomes count, so
+# when a layout change makes the current winner fail it drops behind the
+# strategy that works now within a few pages.
+WINDOW = int(os.environ.get("SUNBIZ_STRATEGY_WINDOW", "20"))
+
+# Score of a strategy with no recent outcomes: behind strategies that have been
+# working, ahead of ones that have been failing
+UNTRIED_SCORE = 0.5
+
+
+# Remembers which selector or extraction path worked for each page type and
+# orders the candidates so the recent winner is tried first.
+class StrategyRegistry:
+    def __init__(self, window=WINDOW):
+        self.lock = threading.Lock()
+        self.window = window
+        self.recent = {}  # (page type, strategy) -> recent outcomes, 1 for a hit
+        self.totals = {}  # (page type, strategy) -> [hits, tries] since startup
+        self.leaders = {}  # page type -> strategy currently tried first
+        self.reranks = collections.Counter()
+
+    def _score(self, page_type, strategy):
+        recent = self.recent.get((page_type, strategy))
+        return sum(recent) / len(recent) if recent else UNTRIED_SCORE
+
+    # Candidates ordered by recent hit rate, best first; ties keep the given order
+    def order(self, page_type, candidates):
+        with self.lock:
+            ranked = sorted(candidates, key=lambda strategy: -self._score(page_type, strategy))
+            leader = self.leaders.get(page_type)
+            if ranked and ranked[0] != leader:
+                if leader is not None:
+                    self.reranks[page_type] += 1
+                self.leaders[page_type] = ranked[0]
+            return ranked
+
+    def record(self, page_type, strategy, success):
+        with self.lock:
+            recent = self.recent.setdefault((page_type, strategy), collections.deque(maxlen=self.window))
+            recent.append(1 if success else 0)
+            totals = self.totals.setdefault((page_type, strategy), [0, 0])
+            totals[0] += 1 if success else 0
+            totals[1] += 1
+
+    # Record a probe that tried candidates in order until winner matched. Pages
+    # where nothing matched (e.g. an empty result list) are not held against anyone.
+    def record_probe(self, page_type, tried, winner):
+        if winner is None:
+            return
+        for strategy in tried:
+            self.record(page_type, strategy, strategy == winner)
+            if strategy == winner:
+                break
+
+    # Try candidates best first until attempt(candidate) returns a non-empty
+    # result, and return (winning candidate, result) or (None, None)
+    def first_match(self, page_type, candidates, attempt):
+        ordered = self.order(page_type, candidates)
+        for candidate in ordered:
+            result = attempt(candidate)
+            if result:
+                self.record_probe(page_type, ordered, candidate)
+                return candidate, result
+        return None, None
+
+    # One row per strategy with its hit rates, in the order it is currently tried
+    def stats(self):
+        with self.lock:
+            keys = sorted(self.totals, key=lambda key: (key[0], -self._score(*key)))
+            return [
+                {
+                    "Page Type": page_type,
+                    "Strategy": strategy,
+                    "Hits": self.totals[(page_type, strategy)][0],
+                    "Tries": self.totals[(page_type, strategy)][1],
+                    "Hit Rate": round(self.totals[(page_type, strategy)][0] / self.totals[(page_type, strategy)][1], 3),
+                    "Recent Hit Rate": round(self._score(page_type, strategy), 3),
+                    "Re-ranks": self.reranks[page_type]
+                }
+                for page_type, strategy in keys
+            ]
+
+
+# Process-wide registry shared by both scrapers and all sessions
+strategies = StrategyRegistry()